@@ -1,3 +1,29 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+# Compiled word lists: a header with the stamp of the word list file, a
+# table of lengths, and for each length the sorted words back to back
+# followed by the letter masks of each position
+DICT_SUFFIX = ".dict"
+DICT_MAGIC = b"CWDICT01"
+DICT_HEADER = struct.Struct("<8sqqI")
+DICT_BUCKET = struct.Struct("<IIQQ")
+
+# Parsed structures are cached as JSON in this directory next to the
+# structure file, named by a hash of the file contents
+STRUCTURE_CACHE = ".crosswordcache"
+STRUCTURE_VERSION = b"crossword-structure-2\0"
+
+# Positions of the set bits of each byte value
+BYTE_BITS = [
+    tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)
+]
+
+
 class Variable():
 
     ACROSS = "across"
@@ -35,31 +61,296 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class WordIndex():
+    """
+    Bitset index of a word list.
+
+    Words of each length are numbered in sorted order, so a set of words of
+    one length is a bitmask with bit `k` standing for word `k`. For each
+    length, position and letter there is a bitmask of the words having that
+    letter at that position, built the first time the length is needed.
+    """
+
+    def __init__(self, words):
+        self.buckets = dict()
+        for word in sorted(words):
+            self.buckets.setdefault(len(word), []).append(word)
+        self.masks = dict()
+
+        # Compiled file the index is mapped from, if any, and the offset in
+        # it of the letter masks of each length
+        self.path = None
+        self.buffer = None
+        self.mapped = dict()
+
+    @classmethod
+    def load(cls, path, stamp=None):
+        """
+        Map the compiled word list written by `save` at `path`. Return None
+        if it is missing or unreadable, or if a `stamp` is given and the
+        word list has changed since it was compiled.
+        """
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, mtime, size, lengths = DICT_HEADER.unpack_from(buffer)
+        except (OSError, ValueError, struct.error):
+            return None
+        if magic != DICT_MAGIC or stamp not in (None, (mtime, size)):
+            return None
+
+        index = cls(())
+        index.path = path
+        index.buffer = buffer
+        for k in range(lengths):
+            length, count, words, masks = DICT_BUCKET.unpack_from(
+                buffer, DICT_HEADER.size + k * DICT_BUCKET.size
+            )
+            index.buckets[length] = MappedWords(buffer, words, length, count)
+            index.mapped[length] = masks
+        return index
+
+    def save(self, path, stamp):
+        """
+        Compile the index to a file at `path` that `load` can map, with the
+        `stamp` of the word list. Words must be ASCII.
+        """
+        lengths = sorted(self.buckets)
+        offset = DICT_HEADER.size + len(lengths) * DICT_BUCKET.size
+        table = []
+        blocks = []
+        for length in lengths:
+            words = self.bucket(length)
+            size = (len(words) + 7) // 8
+            data = "".join(words).encode("ascii")
+            masks = bytearray()
+            for position in self.letter_masks(length):
+                masks.append(len(position))
+                for letter, mask in sorted(position.items()):
+                    masks += letter.encode("ascii")
+                    masks += mask.to_bytes(size, "little")
+            table.append(DICT_BUCKET.pack(
+                length, len(words), offset, offset + len(data)
+            ))
+            blocks += [data, masks]
+            offset += len(data) + len(masks)
+
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as f:
+            f.write(DICT_HEADER.pack(DICT_MAGIC, *stamp, len(lengths)))
+            f.writelines(table)
+            f.writelines(blocks)
+        os.replace(temporary, path)
+
+    def __getstate__(self):
+        # A mapped index is mapped again when unpickled
+        if self.path is not None:
+            return {"path": self.path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if "buckets" not in state:
+            index = WordIndex.load(state["path"])
+            if index is None:
+                raise ValueError(f"cannot map {state['path']}")
+            state = index.__dict__
+        self.__dict__.update(state)
+
+    def bucket(self, length):
+        """Return the sorted list of words of the given length."""
+        return self.buckets.get(length, [])
+
+    def full(self, length):
+        """Return the bitmask of all words of the given length."""
+        return (1 << len(self.bucket(length))) - 1
+
+    def letter_masks(self, length):
+        """
+        Return a list with, for each position in words of the given length,
+        a dictionary mapping each letter to the bitmask of words with that
+        letter at that position.
+        """
+        if length not in self.masks and length in self.mapped:
+            self.masks[length] = self.read_masks(length)
+        if length not in self.masks:
+            words = self.bucket(length)
+            size = (len(words) + 7) // 8
+            bits = [dict() for _ in range(length)]
+            for k, word in enumerate(words):
+                byte, bit = k >> 3, 1 << (k & 7)
+                for position, letter in enumerate(word):
+                    if letter not in bits[position]:
+                        bits[position][letter] = bytearray(size)
+                    bits[position][letter][byte] |= bit
+            self.masks[length] = [
+                {
+                    letter: int.from_bytes(array, "little")
+                    for letter, array in position.items()
+                }
+                for position in bits
+            ]
+        return self.masks[length]
+
+    def read_masks(self, length):
+        """Read the letter masks of the given length from the mapped file."""
+        size = (len(self.bucket(length)) + 7) // 8
+        offset = self.mapped[length]
+        masks = []
+        for _ in range(length):
+            position = dict()
+            letters = self.buffer[offset]
+            offset += 1
+            for _ in range(letters):
+                letter = chr(self.buffer[offset])
+                position[letter] = int.from_bytes(
+                    self.buffer[offset + 1:offset + 1 + size], "little"
+                )
+                offset += 1 + size
+            masks.append(position)
+        return masks
+
+    def bit(self, word):
+        """Return the bitmask of a single indexed word within its length."""
+        words = self.bucket(len(word))
+        return 1 << bisect.bisect_left(words, word)
+
+    def words(self, length, mask):
+        """Return the words of the given length whose bits are set in mask."""
+        words = self.bucket(length)
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+        result = []
+        for k, value in enumerate(data):
+            if value:
+                result.extend(words[8 * k + bit] for bit in BYTE_BITS[value])
+        return result
+
+
+class Overlaps(dict):
+    """
+    Overlaps of pairs of variables, holding only the pairs that overlap.
+    Looking up any other pair gives None.
+    """
+
+    def __missing__(self, key):
+        return None
+
+
+class MappedWords():
+    """
+    Read-only sequence of the words of one length in a mapped compiled
+    word list, stored back to back.
+    """
+
+    def __init__(self, buffer, offset, length, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.count
+        if not 0 <= k < self.count:
+            raise IndexError("word index out of range")
+        start = self.offset + k * self.length
+        return self.buffer[start:start + self.length].decode("ascii")
+
+    def __iter__(self):
+        end = self.offset + self.count * self.length
+        data = self.buffer[self.offset:end].decode("ascii")
+        for start in range(0, len(data), self.length):
+            yield data[start:start + self.length]
+
+
+def read_words(words_file):
+    """Return the set of words in a word list file, uppercased."""
+    with open(words_file) as f:
+        return set(f.read().upper().splitlines())
+
+
+def load_index(words_file, cache=True):
+    """
+    Return a WordIndex of the words in `words_file`. If `cache` is True,
+    the index is compiled to a file next to the word list, which is mapped
+    instead of reading the word list for as long as that is unchanged.
+    """
+    if not cache:
+        return WordIndex(read_words(words_file))
+    stat = os.stat(words_file)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    path = words_file + DICT_SUFFIX
+    index = WordIndex.load(path, stamp)
+    if index is None:
+        index = WordIndex(read_words(words_file))
+        try:
+            index.save(path, stamp)
+        except (OSError, ValueError):
+            pass
+    return index
+
+
 class Crossword():
 
-    def __init__(self, structure_file, words_file):
+    def __init__(self, structure_file, words_file, index=None, cache=True):
+        """
+        Load the structure and the vocabulary of a crossword. If an already
+        built WordIndex is given as `index`, it is used for the vocabulary
+        instead of reading `words_file`.
 
-        # Determine structure of crossword
-        with open(structure_file) as f:
-            contents = f.read().splitlines()
-            self.height = len(contents)
-            self.width = max(len(line) for line in contents)
-
-            self.structure = []
-            for i in range(self.height):
-                row = []
-                for j in range(self.width):
-                    if j >= len(contents[i]):
-                        row.append(False)
-                    elif contents[i][j] == "_":
-                        row.append(True)
-                    else:
-                        row.append(False)
-                self.structure.append(row)
+        If `cache` is True, the compiled word list is used (see
+        `load_index`), and the parsed structure is cached under a hash of
+        the structure file's contents.
+        """
+        with open(structure_file, "rb") as f:
+            data = f.read()
+        key = hashlib.sha256(STRUCTURE_VERSION + data).hexdigest()
+        path = os.path.join(
+            os.path.dirname(structure_file), STRUCTURE_CACHE, f"{key}.json"
+        )
+        parsed = read_structure_cache(path) if cache else None
+        if parsed is None:
+            self.parse(data.decode())
+            if cache:
+                write_structure_cache(path, self)
+        else:
+            (self.height, self.width, self.structure, self.variables,
+             self.overlaps, self.adjacency) = parsed
 
         # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        if index is None:
+            index = load_index(words_file, cache)
+        self.index = index
+
+    @property
+    def words(self):
+        """Set of all words of the vocabulary."""
+        return set().union(*self.index.buckets.values())
+
+    def parse(self, text):
+        """
+        Determine the structure, variables and overlaps of the crossword
+        described by `text`.
+        """
+
+        # Determine structure of crossword
+        contents = text.splitlines()
+        self.height = len(contents)
+        self.width = max(len(line) for line in contents)
+
+        self.structure = []
+        for i in range(self.height):
+            row = []
+            for j in range(self.width):
+                if j >= len(contents[i]):
+                    row.append(False)
+                elif contents[i][j] == "_":
+                    row.append(True)
+                else:
+                    row.append(False)
+            self.structure.append(row)
 
         # Determine variable set
         self.variables = set()
@@ -108,26 +399,79 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored, found through the variables
+        # covering each cell; any other pair looks up as None.
+        covering = dict()
+        for v in self.variables:
+            for k, cell in enumerate(v.cells):
+                covering.setdefault(cell, []).append((v, k))
+        self.overlaps = Overlaps()
+        for pairs in covering.values():
+            for v1, k1 in pairs:
+                for v2, k2 in pairs:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+
+        # Overlapping variables of each variable
+        self.adjacency = {v: set() for v in self.variables}
+        for v1, v2 in self.overlaps:
+            self.adjacency[v1].add(v2)
+        self.adjacency = {
+            v: frozenset(neighbors) for v, neighbors in self.adjacency.items()
+        }
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.adjacency[var]
+
+
+def read_structure_cache(path):
+    """
+    Load a parsed structure written by `write_structure_cache`, returning
+    a tuple (height, width, structure, variables, overlaps, adjacency), or
+    None if it is missing or cannot be read back.
+    """
+    try:
+        with open(path, "rb") as f:
+            parsed = json.load(f)
+        height, width = int(parsed["height"]), int(parsed["width"])
+        structure = [[bool(cell) for cell in row] for row in parsed["structure"]]
+        order = [
+            Variable(int(i), int(j), str(direction), int(length))
+            for i, j, direction, length in parsed["variables"]
+        ]
+        overlaps = Overlaps()
+        adjacency = {v: set() for v in order}
+        for a, b, k1, k2 in parsed["overlaps"]:
+            overlaps[order[a], order[b]] = (int(k1), int(k2))
+            adjacency[order[a]].add(order[b])
+    except Exception:
+        return None
+    adjacency = {
+        v: frozenset(neighbors) for v, neighbors in adjacency.items()
+    }
+    return height, width, structure, set(order), overlaps, adjacency
+
+
+def write_structure_cache(path, crossword):
+    """Cache the parsed structure of `crossword` at `path`."""
+    order = list(crossword.variables)
+    numbers = {v: n for n, v in enumerate(order)}
+    parsed = {
+        "height": crossword.height,
+        "width": crossword.width,
+        "structure": crossword.structure,
+        "variables": [(v.i, v.j, v.direction, v.length) for v in order],
+        "overlaps": [
+            (numbers[v1], numbers[v2], k1, k2)
+            for (v1, v2), (k1, k2) in crossword.overlaps.items()
+        ],
+    }
+    temporary = f"{path}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, "w") as f:
+            json.dump(parsed, f, separators=(",", ":"))
+        os.replace(temporary, path)
+    except OSError:
+        pass
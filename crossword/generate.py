@@ -1,22 +1,226 @@
+import multiprocessing
+import os
+import random
 import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+)
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 from crossword import *
-import itertools
-import copy
+
+# Nodes allowed in the first attempt of a search with restarts, and the
+# factor by which the allowance grows after each restart
+RESTART_NODES = 100
+RESTART_GROWTH = 1.5
+
+# Domains larger than this are ordered approximately by the "approximate"
+# value order: an evenly spaced sample of about this many values is put
+# first in order, followed by the rest unordered
+LCV_EXACT_LIMIT = 1000
+
+# Seconds a portfolio of searches is given to find a solution
+PORTFOLIO_BUDGET = 60.0
+
+# Search strategies run side by side in a portfolio: constructor options
+# of CrosswordCreator, plus whether to restart with growing node budgets
+STRATEGIES = [
+    dict(),
+    dict(variable_order="degree"),
+    dict(seed=1, restarts=True),
+    dict(seed=2, value_order="random", restarts=True),
+    dict(seed=3, variable_order="degree", restarts=True),
+    dict(seed=4, inference="forward", restarts=True),
+    dict(seed=5, value_order="random", restarts=True),
+    dict(seed=6, variable_order="degree", value_order="random",
+         restarts=True),
+]
+
+# Set in portfolio workers so that the others stop once one is done
+stop_event = None
+
+# Set in batch workers to the word index shared by all puzzles
+word_index = None
+
+# Geometry of the cells of saved images, and the font of their letters
+CELL_SIZE = 100
+CELL_BORDER = 2
+FONT_PATH = "assets/fonts/OpenSans-Regular.ttf"
+FONT_SIZE = 80
+
+# Number of empty grids each renderer keeps, the most recently used ones
+GRID_CACHE_SIZE = 8
+
+# Renderers already created, by font and cell geometry
+renderers = dict()
+
+
+def renderer(font_path=FONT_PATH, font_size=FONT_SIZE, cell_size=CELL_SIZE,
+             cell_border=CELL_BORDER):
+    """Return the renderer for the given font and cells, made once."""
+    key = (font_path, font_size, cell_size, cell_border)
+    if key not in renderers:
+        renderers[key] = Renderer(*key)
+    return renderers[key]
+
+
+class Renderer():
+    """
+    Draws crossword grids as images.
+
+    The font is loaded once, and each cell is drawn once as a tile, blank
+    or with a letter. The empty grids of the last `GRID_CACHE_SIZE`
+    structures are also kept, so a solution is usually drawn by pasting its
+    letter tiles onto a copy.
+    """
+
+    def __init__(self, font_path, font_size, cell_size, cell_border):
+        from PIL import ImageFont
+        self.font = ImageFont.truetype(font_path, font_size)
+        self.cell_size = cell_size
+        self.cell_border = cell_border
+        self.tiles = dict()
+        self.grids = OrderedDict()
+
+    def tile(self, letter):
+        """
+        Return the image of an open cell showing `letter`, or blank if
+        `letter` is None.
+        """
+        if letter not in self.tiles:
+            from PIL import Image, ImageDraw
+            interior_size = self.cell_size - 2 * self.cell_border
+            tile = Image.new(
+                "RGBA", (interior_size + 1, interior_size + 1), "white"
+            )
+            if letter:
+                left, top, right, bottom = self.font.getbbox(letter)
+                ImageDraw.Draw(tile).text(
+                    ((interior_size - (right - left)) / 2 - left,
+                     (interior_size - (bottom - top)) / 2 - top),
+                    letter, fill="black", font=self.font
+                )
+            self.tiles[letter] = tile
+        return self.tiles[letter]
+
+    def grid(self, crossword):
+        """Return the image of the empty grid of `crossword`."""
+        key = tuple(tuple(row) for row in crossword.structure)
+        if key in self.grids:
+            self.grids.move_to_end(key)
+        else:
+            from PIL import Image
+            img = Image.new(
+                "RGBA",
+                (crossword.width * self.cell_size,
+                 crossword.height * self.cell_size),
+                "black"
+            )
+            for i, j in self.cells(crossword):
+                img.paste(self.tile(None), self.corner(i, j))
+            self.grids[key] = img
+            if len(self.grids) > GRID_CACHE_SIZE:
+                self.grids.popitem(last=False)
+        return self.grids[key]
+
+    def cells(self, crossword):
+        """Yield the (i, j) of every open cell of `crossword`."""
+        for i in range(crossword.height):
+            for j in range(crossword.width):
+                if crossword.structure[i][j]:
+                    yield i, j
+
+    def corner(self, i, j):
+        """Return the top left pixel of the interior of cell (i, j)."""
+        return (j * self.cell_size + self.cell_border,
+                i * self.cell_size + self.cell_border)
+
+    def render(self, crossword, letters):
+        """
+        Return the image of `crossword` filled in with `letters`, a 2D
+        array as returned by `CrosswordCreator.letter_grid`.
+        """
+        img = self.grid(crossword).copy()
+        for i, j in self.cells(crossword):
+            if letters[i][j]:
+                img.paste(self.tile(letters[i][j]), self.corner(i, j))
+        return img
+
+    def save(self, crossword, letters, filename):
+        """Save the image of `crossword` filled in with `letters`."""
+        self.render(crossword, letters).save(filename)
+
+    def save_all(self, crossword, solutions, filenames):
+        """
+        Save the image of each 2D array of letters in `solutions` for
+        `crossword` to the corresponding file in `filenames`.
+        """
+        for letters, filename in zip(solutions, filenames):
+            self.save(crossword, letters, filename)
 
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, inference="mac", variable_order="mrv",
+                 value_order="lcv", seed=None):
         """
         Create new CSP crossword generate.
+
+        `inference` is the propagation run after each assignment during
+        search: "mac" to maintain arc consistency, "forward" for forward
+        checking, or None for none.
+
+        `variable_order` is "mrv" to pick the variable with the fewest
+        remaining values first, breaking ties by degree, or "degree" for
+        the reverse. `value_order` is "lcv" for least constraining value
+        first, "approximate" to only put the least constraining values
+        first in large domains, or "random". With a `seed`, ties in either
+        order are broken at random.
         """
+        if inference not in ("mac", "forward", None):
+            raise ValueError(f"unknown inference {inference!r}")
+        if variable_order not in ("mrv", "degree"):
+            raise ValueError(f"unknown variable order {variable_order!r}")
+        if value_order not in ("lcv", "approximate", "random"):
+            raise ValueError(f"unknown value order {value_order!r}")
+        self.inference = inference
+        self.variable_order = variable_order
+        self.value_order = value_order
+        self.random = random.Random(seed) if seed is not None else None
         self.crossword = crossword
+        self.index = crossword.index
+
+        # Domains are bitmasks over the indexed words of the variable's length
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.index.full(var.length)
             for var in self.crossword.variables
         }
 
+        # Support counts of the current domains: for each variable, a
+        # dictionary mapping positions to the number of words in the domain
+        # with each letter at that position, filled in as needed
+        self.supports = dict()
+
+        # Search state: domains replaced since the start of search, so that
+        # they can be restored, and the words used by the assignment
+        self.trail = []
+        self.used = set()
+        self.stats = {"nodes": 0, "propagation_time": 0.0}
+
+        # Limits on the search: nodes per attempt and a time.time() deadline,
+        # and whether the last search stopped at one of them
+        self.node_limit = None
+        self.deadline = None
+        self.aborted = False
+
+    def values(self, var):
+        """
+        Return the list of words in the domain of `var`.
+        """
+        return self.index.words(var.length, self.domains[var])
+
     def letter_grid(self, assignment):
         """
         Return 2D array representing a given assignment.
@@ -33,67 +237,61 @@ class CrosswordCreator():
                 letters[i][j] = word[k]
         return letters
 
-    def print(self, assignment):
+    def text(self, assignment):
         """
-        Print crossword assignment to the terminal.
+        Return crossword assignment as text, one line per row.
         """
         letters = self.letter_grid(assignment)
+        rows = []
         for i in range(self.crossword.height):
+            row = []
             for j in range(self.crossword.width):
                 if self.crossword.structure[i][j]:
-                    print(letters[i][j] or " ", end="")
+                    row.append(letters[i][j] or " ")
                 else:
-                    print("█", end="")
-            print()
+                    row.append("█")
+            rows.append("".join(row))
+        return "\n".join(rows)
+
+    def print(self, assignment):
+        """
+        Print crossword assignment to the terminal.
+        """
+        print(self.text(assignment))
 
     def save(self, assignment, filename):
         """
         Save crossword assignment to an image file.
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
-        letters = self.letter_grid(assignment)
-
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
-            "black"
-        )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
-
-        for i in range(self.crossword.height):
-            for j in range(self.crossword.width):
-
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
-                    if letters[i][j]:
-                        w, h = draw.textsize(letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
-                        )
+        renderer().save(self.crossword, self.letter_grid(assignment), filename)
 
-        img.save(filename)
-
-    def solve(self):
+    def solve(self, restarts=False, deadline=None):
         """
         Enforce node and arc consistency, and then solve the CSP.
+
+        With `restarts`, the search is abandoned after `RESTART_NODES`
+        nodes and started over with a budget `RESTART_GROWTH` times larger,
+        which only helps when ties are broken at random. The search gives
+        up, returning None, at the `deadline` given as a time.time() value.
         """
+        self.deadline = deadline
+        self.node_limit = RESTART_NODES if restarts else None
         self.enforce_node_consistency()
         self.ac3()
-        return self.backtrack(dict())
+
+        totals = {"nodes": 0, "propagation_time": 0.0, "restarts": 0}
+        while True:
+            assignment = self.backtrack(dict())
+            totals["nodes"] += self.stats["nodes"]
+            totals["propagation_time"] += self.stats["propagation_time"]
+            if assignment is not None or not self.aborted:
+                break
+            if self.interrupted():
+                break
+            totals["restarts"] += 1
+            self.node_limit = int(self.node_limit * RESTART_GROWTH)
+        self.stats = totals
+        return assignment
 
     def enforce_node_consistency(self):
         """
@@ -103,13 +301,8 @@ class CrosswordCreator():
         """
 
         for var in self.domains.keys():
-            rem = set()
-            for word in self.domains[var] :
-                if len(word) != var.length : rem.add(word)
-            for word in rem :
-                self.domains[var].remove(word)
-
-        # raise NotImplementedError
+            self.domains[var] &= self.index.full(var.length)
+        self.supports.clear()
 
     def revise(self, x, y):
         """
@@ -127,22 +320,54 @@ class CrosswordCreator():
         ix = ov[0]
         jy = ov[1]
 
-        rem = set()
-        for wx in self.domains[x] :
-            found = False
-            for wy in self.domains[y]:
-                if wx[ix] == wy[jy] :
-                    found = True
-                    break
-            
-            if not found : rem.add(wx)
-
-        for word in rem :
-            self.domains[x].remove(word)
+        # Keep the words of x whose overlapping letter some word of y has
+        x_masks = self.index.letter_masks(x.length)[ix]
+        allowed = 0
+        for letter, mask in self.index.letter_masks(y.length)[jy].items():
+            if self.domains[y] & mask and letter in x_masks:
+                allowed |= x_masks[letter]
+
+        revised = self.domains[x] & allowed
+        if revised == self.domains[x]:
+            return False
+        self.prune(x, revised)
+        return True
 
-        return len(rem)>0
+    def prune(self, var, domain):
+        """
+        Replace the domain of `var` by `domain`, recording the old domain
+        and its support counts on the trail so that `undo` can restore them.
+        """
+        counts = self.supports.pop(var, None)
+        self.trail.append((var, self.domains[var], counts))
+        self.domains[var] = domain
 
-        raise NotImplementedError
+    def undo(self, mark):
+        """
+        Restore every domain pruned since the trail had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain, counts = self.trail.pop()
+            self.domains[var] = domain
+            if counts is None:
+                self.supports.pop(var, None)
+            else:
+                self.supports[var] = counts
+
+    def support(self, var, position):
+        """
+        Return a dictionary mapping each letter to the number of words in
+        the domain of `var` with that letter at `position`.
+        """
+        counts = self.supports.setdefault(var, dict())
+        if position not in counts:
+            domain = self.domains[var]
+            counts[position] = {
+                letter: (domain & mask).bit_count()
+                for letter, mask
+                in self.index.letter_masks(var.length)[position].items()
+            }
+        return counts[position]
 
     def ac3(self, arcs=None):
         """
@@ -155,22 +380,26 @@ class CrosswordCreator():
         """
 
         if arcs is None:
-            q = list(itertools.product(self.crossword.variables,self.crossword.variables))
-            q = [arc for arc in q if arc[0]!=arc[1] and self.crossword.overlaps[arc[0],arc[1]] is not None]
-        else : q=arcs
-
-        while len(q):
-            cur = q.pop(0)
-            x, y=cur[0],cur[1]
-            if self.revise(x,y):
-                if not self.domains[x] :
+            arcs = [
+                (x, y) for x in self.crossword.variables
+                for y in self.crossword.neighbors(x)
+            ]
+
+        # Each arc is queued at most once at a time
+        queue = deque(arcs)
+        queued = set(queue)
+        while queue:
+            x, y = queue.popleft()
+            queued.discard((x, y))
+            if self.revise(x, y):
+                if not self.domains[x]:
                     return False
-                for z in (self.crossword.neighbors(x) - {y}):
-                    q.append((z,x))
+                for z in self.crossword.neighbors(x):
+                    if z != y and (z, x) not in queued:
+                        queue.append((z, x))
+                        queued.add((z, x))
 
         return True
-        
-        raise NotImplementedError
 
     def assignment_complete(self, assignment):
         """
@@ -208,20 +437,33 @@ class CrosswordCreator():
         that rules out the fewest values among the neighbors of `var`.
         """
 
-        res = []
-        check = (self.crossword.neighbors(var) - set(assignment.keys()))
-        for choice in self.domains[var] :
-            cnt = 0
-            for nei in check:
+        res = self.values(var)
+        if self.value_order == "random":
+            (self.random or random).shuffle(res)
+            return res
+        if self.random is not None:
+            self.random.shuffle(res)
+
+        # Values ruled out in a neighbor are the words without the letter
+        # the choice puts in the shared cell
+        check = []
+        for nei in self.crossword.neighbors(var):
+            if nei not in assignment:
                 ov = self.crossword.overlaps[var,nei]
-                for word in self.domains[nei] :
-                    cnt += (choice[ov[0]]!=word[ov[1]])
-            cur = [choice,cnt]
-            res.append(cur)
+                size = self.domains[nei].bit_count()
+                check.append((ov[0], size, self.support(nei, ov[1])))
 
-        return [cur[0] for cur in sorted(res,key=lambda it : it[1])]
+        def ruled_out(choice):
+            return sum(
+                size - support.get(choice[i], 0) for i, size, support in check
+            )
 
-        raise NotImplementedError
+        if self.value_order == "approximate" and len(res) > LCV_EXACT_LIMIT:
+            step = len(res) // LCV_EXACT_LIMIT + 1
+            rest = [choice for k, choice in enumerate(res) if k % step]
+            return sorted(res[::step], key=ruled_out) + rest
+
+        return sorted(res, key=ruled_out)
 
     def select_unassigned_variable(self, assignment):
         """
@@ -234,13 +476,19 @@ class CrosswordCreator():
 
         res = []
         for var in self.crossword.variables - assignment.keys() : 
-            remval = len(self.domains[var])
+            remval = self.domains[var].bit_count()
             nei = len(self.crossword.neighbors(var)) 
             cur = [var,remval,nei]
             res.append(cur)
 
-        res = sorted(res, key = lambda cur: cur[2],reverse=True)
-        res = sorted(res, key = lambda cur : cur[1])
+        if self.random is not None:
+            self.random.shuffle(res)
+        if self.variable_order == "degree":
+            res = sorted(res, key = lambda cur : cur[1])
+            res = sorted(res, key = lambda cur: cur[2],reverse=True)
+        else:
+            res = sorted(res, key = lambda cur: cur[2],reverse=True)
+            res = sorted(res, key = lambda cur : cur[1])
 
         return res[0][0]
         raise NotImplementedError
@@ -254,40 +502,332 @@ class CrosswordCreator():
 
         If no assignment is possible, return None.
         """
-        if self.assignment_complete(assignment) : return assignment
+        self.trail = []
+        self.used = set(assignment.values())
+        self.stats = {"nodes": 0, "propagation_time": 0.0}
+        self.aborted = False
+        return self.search(assignment)
+
+    def search(self, assignment):
+        """
+        Extend `assignment` in place by backtracking search, returning it
+        once complete or None if no assignment is possible.
+
+        Each value tried only needs checking against the constraints of the
+        variable it is assigned to, and every domain change it leads to is
+        undone from the trail when the value is abandoned.
+
+        Once a limit of the search is reached, every level gives up.
+        """
+        if len(assignment) == len(self.crossword.variables) : return assignment
+
+        if self.limit_reached():
+            return None
 
+        self.stats["nodes"] += 1
         cur = self.select_unassigned_variable(assignment)
 
         for val in self.order_domain_values(cur,assignment) :
-            try_ass = copy.deepcopy(assignment)
-            try_ass[cur] = val
-            if self.consistent(try_ass) :
-                assignment[cur] =val
-                res = self.backtrack(assignment)
+            if self.aborted or self.interrupted():
+                self.aborted = True
+                return None
+            if not self.consistent_value(cur, val, assignment):
+                continue
+            mark = len(self.trail)
+            assignment[cur] = val
+            self.used.add(val)
+            self.prune(cur, self.index.bit(val))
+
+            if self.infer(cur, assignment):
+                res = self.search(assignment)
                 if res is not None :
                     return res
-            assignment.pop(cur,None)
+
+            del assignment[cur]
+            self.used.discard(val)
+            self.undo(mark)
+            if self.aborted:
+                return None
 
         return None
 
-        raise NotImplementedError
+    def limit_reached(self):
+        """
+        Return True, marking the search as aborted, if it has reached its
+        node limit or has been interrupted.
+        """
+        if self.aborted or self.interrupted() or (
+            self.node_limit is not None
+            and self.stats["nodes"] >= self.node_limit
+        ):
+            self.aborted = True
+        return self.aborted
+
+    def interrupted(self):
+        """
+        Return True if the deadline has passed or another search in the
+        portfolio has finished.
+        """
+        if self.deadline is not None and time.time() >= self.deadline:
+            return True
+        return stop_event is not None and stop_event.is_set()
+
+    def infer(self, var, assignment):
+        """
+        Propagate the assignment of `var` into the domains of its
+        unassigned neighbors, according to `self.inference`. Prunings go on
+        the trail, so the caller undoes them if the value is abandoned.
+
+        Return False if some domain ends up empty.
+        """
+        if self.inference is None:
+            return True
+
+        start = time.perf_counter()
+        arcs = [
+            (nei, var) for nei in self.crossword.neighbors(var)
+            if nei not in assignment
+        ]
+        if self.inference == "mac":
+            result = self.ac3(arcs)
+        else:
+            result = all(
+                not self.revise(x, y) or self.domains[x] for x, y in arcs
+            )
+        self.stats["propagation_time"] += time.perf_counter() - start
+        return result
+
+    def consistent_value(self, var, word, assignment):
+        """
+        Return True if assigning `word` to `var` keeps the consistent
+        `assignment` consistent, checking only the constraints on `var`.
+        """
+        if word in self.used or len(word) != var.length: return False
+
+        for nei in self.crossword.neighbors(var):
+            if nei in assignment:
+                ov = self.crossword.overlaps[var,nei]
+                if word[ov[0]] != assignment[nei][ov[1]] : return False
+
+        return True
+
+
+def solve_portfolio(crossword, strategies=STRATEGIES, processes=None,
+                    budget=PORTFOLIO_BUDGET):
+    """
+    Run a search with each of `strategies` side by side in a process pool,
+    and return a tuple (assignment, strategy, stats) for the first search
+    to finish. The assignment is None if that search proved there is no
+    solution; if no search finishes within `budget` seconds, the whole
+    tuple is None.
+    """
+    deadline = time.time() + budget
+    workers = processes or min(len(strategies), os.cpu_count() or 1)
+    event = multiprocessing.Event()
+    with ProcessPoolExecutor(
+        workers, initializer=set_stop_event, initargs=(event,)
+    ) as executor:
+        futures = {
+            executor.submit(solve_strategy, crossword, strategy, deadline):
+                strategy
+            for strategy in strategies
+        }
+        try:
+            for future in as_completed(futures, timeout=budget):
+                assignment, aborted, stats = future.result()
+                if assignment is not None or not aborted:
+                    return assignment, futures[future], stats
+        except FuturesTimeoutError:
+            pass
+        finally:
+            event.set()
+            for future in futures:
+                future.cancel()
+    return None, None, None
+
+
+def set_stop_event(event):
+    """Initializes a portfolio worker with the shared stop event."""
+    global stop_event
+    stop_event = event
+
+
+def solve_strategy(crossword, strategy, deadline):
+    """
+    Solve `crossword` with one strategy of a portfolio, returning the
+    assignment, whether the search was cut short, and its statistics.
+    """
+    options = dict(strategy)
+    restarts = options.pop("restarts", False)
+    creator = CrosswordCreator(crossword, **options)
+    assignment = creator.solve(restarts, deadline)
+    return assignment, creator.aborted, creator.stats
+
+
+def generate_batch(words_file, structures, output_dir, processes=None,
+                   images=False):
+    """
+    Solve every structure file in `structures` against the word list in
+    `words_file`, concurrently in a process pool. The words are read and
+    indexed once, and the index is shared by the workers. Structures are
+    submitted as `structures` yields them, keeping at most two per worker
+    waiting, so it may be fed from a stream.
+
+    Each solution is written as text to `output_dir`, in a file named after
+    its structure file with the extension .solution.txt, numbered when two
+    structures share a name, and with `images` also as a PNG image next to
+    it. Yield a tuple (structure, output, error) as each puzzle is done,
+    where output is None if it has no solution, and error is the exception
+    that stopped it, if any.
+    """
+    index = load_index(words_file)
+    for length in index.buckets:
+        index.letter_masks(length)
+
+    os.makedirs(output_dir, exist_ok=True)
+    workers = processes or os.cpu_count() or 1
+    outputs = set()
+    taken = set()
+    with ProcessPoolExecutor(
+        workers, initializer=set_word_index, initargs=(index,)
+    ) as executor:
+        pending = {}
+        for structure in structures:
+            path = os.path.realpath(structure)
+            if path in outputs:
+                yield structure, None, ValueError(
+                    "structure is an output of this batch"
+                )
+                continue
+            taken.add(path)
+            output = output_name(structure, output_dir, taken)
+            outputs.add(os.path.realpath(output))
+            future = executor.submit(solve_file, structure, output, images)
+            pending[future] = structure
+            while len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from batch_results(done, pending)
+        yield from batch_results(as_completed(pending), pending)
+
+
+def output_name(structure, output_dir, taken):
+    """
+    Return a path in `output_dir` for the solution of `structure` whose
+    real path is not in `taken`, the inputs and outputs so far, and add it
+    to `taken`.
+    """
+    stem = os.path.splitext(os.path.basename(structure))[0]
+    output = os.path.join(output_dir, f"{stem}.solution.txt")
+    count = 1
+    while os.path.realpath(output) in taken:
+        count += 1
+        output = os.path.join(output_dir, f"{stem}-{count}.solution.txt")
+    taken.add(os.path.realpath(output))
+    return output
+
+
+def batch_results(futures, pending):
+    """
+    Yield a tuple (structure, output, error) for each of the finished
+    `futures`, removing them from `pending`.
+    """
+    for future in futures:
+        structure = pending.pop(future)
+        try:
+            output = future.result()
+        except Exception as error:
+            yield structure, None, error
+        else:
+            yield structure, output, None
+
+
+def set_word_index(index):
+    """Initializes a batch worker with the shared word index."""
+    global word_index
+    word_index = index
+
+
+def solve_file(structure, output, images=False):
+    """
+    Solve the crossword in `structure` with the shared word index, and
+    write the solution to `output`, with `images` also as an image. Return
+    the output file, or None if there is no solution.
+    """
+    crossword = Crossword(structure, None, index=word_index)
+    creator = CrosswordCreator(crossword)
+    assignment = creator.solve()
+    if assignment is None:
+        return None
+    with open(output, "w") as f:
+        f.write(creator.text(assignment) + "\n")
+    if images:
+        creator.save(assignment, os.path.splitext(output)[0] + ".png")
+    return output
+
+
+def structure_files(paths):
+    """
+    Yield the structure files named by `paths`, taking every .txt file of
+    a directory in order. With no paths, they are read from standard input,
+    one per line.
+    """
+    if not paths:
+        paths = (line.strip() for line in sys.stdin if line.strip())
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".txt"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
 
 
 def main():
 
     # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    args = sys.argv[1:]
+    if args[:1] == ["--batch"]:
+        images = "--images" in args
+        if images:
+            args.remove("--images")
+        if len(args) < 3:
+            sys.exit("Usage: python generate.py --batch [--images] words "
+                     "output [structure ...]")
+        results = generate_batch(
+            args[1], structure_files(args[3:]), args[2], images=images
+        )
+        for structure, output, error in results:
+            if error is not None:
+                print(f"{structure}: Error: {error}")
+            else:
+                print(f"{structure}: {output or 'No solution.'}")
+        return
+
+    portfolio = "--portfolio" in args
+    if portfolio:
+        args.remove("--portfolio")
+    if len(args) not in [2, 3]:
+        sys.exit("Usage: python generate.py [--portfolio] "
+                 "structure words [output]\n"
+                 "       python generate.py --batch [--images] words "
+                 "output [structure ...]")
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    structure = args[0]
+    words = args[1]
+    output = args[2] if len(args) == 3 else None
 
     # Generate crossword
     crossword = Crossword(structure, words)
     creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    if portfolio:
+        assignment, strategy, stats = solve_portfolio(crossword)
+        if strategy is None:
+            sys.exit("No solution found in time.")
+        print(f"Solved with strategy {strategy}")
+        creator.stats = stats
+    else:
+        assignment = creator.solve()
 
     # Print result
     if assignment is None:
@@ -296,6 +836,8 @@ def main():
         creator.print(assignment)
         if output:
             creator.save(assignment, output)
+    print(f"Nodes expanded: {creator.stats['nodes']}, "
+          f"propagation time: {creator.stats['propagation_time']:.3f}s")
 
 
 if __name__ == "__main__":
@@ -1,19 +1,132 @@
+import heapq
 import itertools
+import multiprocessing
+import re
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+BLOCK_SYMBOLS = 12
+RESTART_INTERVAL = 100
+RESTART_GROWTH = 1.5
+ACTIVITY_DECAY = 0.95
+
+TOKEN_PATTERN = re.compile(r"<=>|=>|[¬∧∨()]|[^¬∧∨()<=]+")
+PRECEDENCE = {"<=>": 0, "=>": 1, "∨": 2, "∧": 3, "¬": 4}
+
+# Set in worker processes to stop enumeration once a counter-model is found
+stop_event = None
 
 
 class Sentence():
+    """
+    Base class of logical sentences.
+
+    Symbols, negations, disjunctions, implications and biconditionals are
+    hash-consed: constructing one that is structurally equal to a live
+    sentence built from the same operands returns that sentence. Hashes and
+    symbol sets are computed once and cached. Conjunctions can grow with
+    `And.add`, so each one stays a distinct object, and every sentence
+    containing a conjunction keeps weak references to the sentences it is
+    part of, so that their cached values are dropped when it grows.
+    """
+
+    __slots__ = ("_hash", "_symbols", "_parents", "__weakref__")
+
+    interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def intern(cls, key, children, **fields):
+        """
+        Returns the shared sentence of class `cls` for `key`, creating it
+        with attributes `fields` and subsentences `children` if there is
+        none.
+        """
+        key = (cls, *key)
+        sentence = Sentence.interned.get(key)
+        if sentence is None:
+            sentence = object.__new__(cls)
+            for field, value in fields.items():
+                setattr(sentence, field, value)
+            sentence._hash = None
+            sentence._symbols = None
+            sentence._parents = None
+            sentence.adopt(children)
+            Sentence.interned[key] = sentence
+        return sentence
+
+    def adopt(self, children):
+        """
+        Registers this sentence as a parent of those of `children` that
+        contain a conjunction.
+        """
+        for child in children:
+            if child._parents is not None:
+                if self._parents is None:
+                    self._parents = weakref.WeakValueDictionary()
+                child._parents[id(self)] = self
+
+    def invalidate(self):
+        """
+        Drops the cached values of this sentence and of every sentence
+        containing it.
+        """
+        stack = [self]
+        seen = set()
+        while stack:
+            sentence = stack.pop()
+            if id(sentence) in seen:
+                continue
+            seen.add(id(sentence))
+            sentence._hash = None
+            sentence._symbols = None
+            if sentence._parents is not None:
+                stack.extend(sentence._parents.values())
 
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
 
+    def evaluate_bits(self, masks, full):
+        """
+        Evaluates the logical sentence in a block of models at once.
+        `masks` maps each symbol to a bitmask of the models in which it is
+        true, and `full` has a bit set for every model in the block.
+        Returns the bitmask of models in which the sentence is true.
+        """
+        raise Exception("nothing to evaluate")
+
     def formula(self):
         """Returns string formula representing logical sentence."""
         return ""
 
     def symbols(self):
-        """Returns a set of all symbols in the logical sentence."""
-        return set()
+        """
+        Returns a set of all symbols in the logical sentence. The set may
+        be cached and shared, so it must not be modified.
+
+        The sets of subsentences are cached in post-order from an explicit
+        stack, so deeply nested sentences do not recurse.
+        """
+        stack = [(self, False)]
+        while stack:
+            node, ready = stack.pop()
+            if node._symbols is not None:
+                continue
+            if isinstance(node, Symbol):
+                node._symbols = {node.name}
+                continue
+            children = CNF.children(node)
+            if not ready:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children)
+            elif len(children) == 1:
+                node._symbols = children[0]._symbols
+            else:
+                node._symbols = set().union(
+                    *[child._symbols for child in children]
+                )
+        return self._symbols
 
     @classmethod
     def validate(cls, sentence):
@@ -43,15 +156,21 @@ class Sentence():
 
 
 class Symbol(Sentence):
+    __slots__ = ("name",)
+
+    def __new__(cls, name):
+        return cls.intern((name,), (), name=name)
 
-    def __init__(self, name):
-        self.name = name
+    def __reduce__(self):
+        return (type(self), (self.name,))
 
     def __eq__(self, other):
         return isinstance(other, Symbol) and self.name == other.name
 
     def __hash__(self):
-        return hash(("symbol", self.name))
+        if self._hash is None:
+            self._hash = hash(("symbol", self.name))
+        return self._hash
 
     def __repr__(self):
         return self.name
@@ -62,23 +181,40 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def evaluate_bits(self, masks, full):
+        try:
+            return masks[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
+
     def formula(self):
         return self.name
 
     def symbols(self):
-        return {self.name}
+        if self._symbols is None:
+            self._symbols = {self.name}
+        return self._symbols
 
 
 class Not(Sentence):
-    def __init__(self, operand):
+    __slots__ = ("operand",)
+
+    def __new__(cls, operand):
         Sentence.validate(operand)
-        self.operand = operand
+        return cls.intern((id(operand),), (operand,), operand=operand)
+
+    def __reduce__(self):
+        return (type(self), (self.operand,))
 
     def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+        return self is other or (
+            isinstance(other, Not) and self.operand == other.operand
+        )
 
     def __hash__(self):
-        return hash(("not", hash(self.operand)))
+        if self._hash is None:
+            self._hash = hash(("not", hash(self.operand)))
+        return self._hash
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -86,26 +222,39 @@ class Not(Sentence):
     def evaluate(self, model):
         return not self.operand.evaluate(model)
 
+    def evaluate_bits(self, masks, full):
+        return full ^ self.operand.evaluate_bits(masks, full)
+
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
-
 
 class And(Sentence):
+    __slots__ = ("conjuncts",)
+
     def __init__(self, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
+        self._hash = None
+        self._symbols = None
+        self._parents = weakref.WeakValueDictionary()
+        self.adopt(conjuncts)
+
+    def __reduce__(self):
+        return (type(self), tuple(self.conjuncts))
 
     def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+        return self is other or (
+            isinstance(other, And) and self.conjuncts == other.conjuncts
+        )
 
     def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+        if self._hash is None:
+            self._hash = hash(
+                ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
+            )
+        return self._hash
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -114,35 +263,54 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
+        """
+        Adds a conjunct, dropping the cached values of this conjunction and
+        of the sentences containing it.
+        """
         Sentence.validate(conjunct)
         self.conjuncts.append(conjunct)
+        self.adopt([conjunct])
+        self.invalidate()
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
+    def evaluate_bits(self, masks, full):
+        result = full
+        for conjunct in self.conjuncts:
+            result &= conjunct.evaluate_bits(masks, full)
+        return result
+
     def formula(self):
         if len(self.conjuncts) == 1:
             return self.conjuncts[0].formula()
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
-
 
 class Or(Sentence):
-    def __init__(self, *disjuncts):
+    __slots__ = ("disjuncts",)
+
+    def __new__(cls, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
-        self.disjuncts = list(disjuncts)
+        key = tuple(id(disjunct) for disjunct in disjuncts)
+        return cls.intern(key, disjuncts, disjuncts=list(disjuncts))
+
+    def __reduce__(self):
+        return (type(self), tuple(self.disjuncts))
 
     def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+        return self is other or (
+            isinstance(other, Or) and self.disjuncts == other.disjuncts
+        )
 
     def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+        if self._hash is None:
+            self._hash = hash(
+                ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
+            )
+        return self._hash
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -151,30 +319,46 @@ class Or(Sentence):
     def evaluate(self, model):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
+    def evaluate_bits(self, masks, full):
+        result = 0
+        for disjunct in self.disjuncts:
+            result |= disjunct.evaluate_bits(masks, full)
+        return result
+
     def formula(self):
         if len(self.disjuncts) == 1:
             return self.disjuncts[0].formula()
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
-
 
 class Implication(Sentence):
-    def __init__(self, antecedent, consequent):
+    __slots__ = ("antecedent", "consequent")
+
+    def __new__(cls, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
-        self.antecedent = antecedent
-        self.consequent = consequent
+        return cls.intern(
+            (id(antecedent), id(consequent)), (antecedent, consequent),
+            antecedent=antecedent, consequent=consequent
+        )
+
+    def __reduce__(self):
+        return (type(self), (self.antecedent, self.consequent))
 
     def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
+        return self is other or (
+            isinstance(other, Implication)
+            and self.antecedent == other.antecedent
+            and self.consequent == other.consequent
+        )
 
     def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        if self._hash is None:
+            self._hash = hash(
+                ("implies", hash(self.antecedent), hash(self.consequent))
+            )
+        return self._hash
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -183,29 +367,42 @@ class Implication(Sentence):
         return ((not self.antecedent.evaluate(model))
                 or self.consequent.evaluate(model))
 
+    def evaluate_bits(self, masks, full):
+        return ((full ^ self.antecedent.evaluate_bits(masks, full))
+                | self.consequent.evaluate_bits(masks, full))
+
     def formula(self):
         antecedent = Sentence.parenthesize(self.antecedent.formula())
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
-
 
 class Biconditional(Sentence):
-    def __init__(self, left, right):
+    __slots__ = ("left", "right")
+
+    def __new__(cls, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
-        self.left = left
-        self.right = right
+        return cls.intern(
+            (id(left), id(right)), (left, right), left=left, right=right
+        )
+
+    def __reduce__(self):
+        return (type(self), (self.left, self.right))
 
     def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
+        return self is other or (
+            isinstance(other, Biconditional)
+            and self.left == other.left
+            and self.right == other.right
+        )
 
     def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        if self._hash is None:
+            self._hash = hash(
+                ("biconditional", hash(self.left), hash(self.right))
+            )
+        return self._hash
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
@@ -216,48 +413,1143 @@ class Biconditional(Sentence):
                 or (not self.left.evaluate(model)
                     and not self.right.evaluate(model)))
 
+    def evaluate_bits(self, masks, full):
+        return full ^ (self.left.evaluate_bits(masks, full)
+                       ^ self.right.evaluate_bits(masks, full))
+
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
-
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+class CNF():
+    """
+    Conjunctive normal form over integer literals. The symbol numbered `i`
+    (counting from 1) is the literal `i`, and its negation is `-i`; each
+    clause is a tuple of literals.
+    """
+
+    def __init__(self, *sentences):
+        self.names = []
+        self.index = dict()
+        self.clauses = []
+        self.definitions = dict()
+        for sentence in sentences:
+            self.add(sentence)
+
+    def variable(self, name):
+        """Returns the number of symbol `name`, numbering it if new."""
+        if name not in self.index:
+            self.names.append(name)
+            self.index[name] = len(self.names)
+        return self.index[name]
+
+    def auxiliary(self):
+        """Returns the number of a new variable that names no symbol."""
+        self.names.append(None)
+        return len(self.names)
+
+    def add(self, sentence):
+        """
+        Adds the clauses of a logical sentence. Compound subsentences below
+        its top-level conjunctions and disjunctions are named by auxiliary
+        variables (see `encode`) rather than distributed, which keeps the
+        clauses linear in the sentence size.
+        """
+        conjuncts = (sentence.conjuncts if isinstance(sentence, And)
+                     else [sentence])
+        for conjunct in conjuncts:
+            disjuncts = (conjunct.disjuncts if isinstance(conjunct, Or)
+                         else [conjunct])
+            self.clauses.append(
+                tuple(self.encode(disjunct) for disjunct in disjuncts)
+            )
+
+    def encode(self, sentence):
+        """
+        Returns a literal equivalent to `sentence`, adding the Tseitin
+        clauses that define an auxiliary variable for each compound
+        subsentence the first time it is encoded.
+
+        Subsentences are encoded in post-order from an explicit stack, so
+        deeply nested sentences do not recurse.
+        """
+        literals = dict()
+        stack = [(sentence, False)]
+        while stack:
+            node, ready = stack.pop()
+            if id(node) in literals:
+                continue
+            if isinstance(node, Symbol):
+                literals[id(node)] = self.variable(node.name)
+                continue
+            children = CNF.children(node)
+            if not ready:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children)
+                continue
+
+            # Children are hashed already, so hashing here does not recurse
+            parts = [literals[id(child)] for child in children]
+            if isinstance(node, Not):
+                hash(node)
+                literals[id(node)] = -parts[0]
+                continue
+            if node in self.definitions:
+                literals[id(node)] = self.definitions[node]
+                continue
+
+            x = self.auxiliary()
+            if isinstance(node, And):
+                self.clauses.extend((-x, part) for part in parts)
+                self.clauses.append((x, *(-part for part in parts)))
+            elif isinstance(node, Or):
+                self.clauses.extend((x, -part) for part in parts)
+                self.clauses.append((-x, *parts))
+            elif isinstance(node, Implication):
+                a, b = parts
+                self.clauses.extend([(-x, -a, b), (x, a), (x, -b)])
+            else:
+                a, b = parts
+                self.clauses.extend(
+                    [(-x, -a, b), (-x, a, -b), (x, a, b), (x, -a, -b)]
+                )
+            self.definitions[node] = x
+            literals[id(node)] = x
+        return literals[id(sentence)]
+
+    @staticmethod
+    def children(sentence):
+        """Returns the list of immediate subsentences of a compound one."""
+        if isinstance(sentence, Not):
+            return [sentence.operand]
+        elif isinstance(sentence, And):
+            return sentence.conjuncts
+        elif isinstance(sentence, Or):
+            return sentence.disjuncts
+        elif isinstance(sentence, Implication):
+            return [sentence.antecedent, sentence.consequent]
+        elif isinstance(sentence, Biconditional):
+            return [sentence.left, sentence.right]
+        raise TypeError(f"cannot convert {sentence!r} to CNF")
+
+
+class Solver():
+    """
+    CDCL satisfiability solver over integer-literal clauses, with two
+    watched literals per clause, unit propagation, first-UIP clause
+    learning, activity-based branching and restarts.
+    """
+
+    def __init__(self, cnf=None):
+        self.ok = True
+        self.truth = dict()
+        self.values = [None]
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+        self.watches = dict()
+        self.clauses = []
+        self.learnts = []
+        self.trail = []
+        self.limits = []
+        self.head = 0
+        self.increment = 1.0
+        self.order = []
+        self.model = None
+        if cnf is not None:
+            for clause in cnf.clauses:
+                self.add_clause(clause)
+
+    def reserve(self, variable):
+        """Makes room for variables numbered up to `variable`."""
+        missing = variable + 1 - len(self.values)
+        if missing > 0:
+            self.values.extend([None] * missing)
+            self.levels.extend([0] * missing)
+            self.reasons.extend([None] * missing)
+            self.activity.extend([0.0] * missing)
+            self.phases.extend([False] * missing)
+            for new in range(variable + 1 - missing, variable + 1):
+                heapq.heappush(self.order, (0.0, new))
+
+    def value(self, literal):
+        """Returns True, False or None if `literal` is unassigned."""
+        return self.truth.get(literal)
+
+    def add_clause(self, literals):
+        """
+        Adds a clause. Returns False if the clauses are now known to be
+        unsatisfiable, True otherwise.
+        """
+        if not self.ok:
+            return False
+        clause = []
+        for literal in literals:
+            self.reserve(abs(literal))
+            value = self.value(literal)
+            if value is True or -literal in clause:
+                return True
+            if value is None and literal not in clause:
+                clause.append(literal)
+
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.clauses.append(clause)
+            self.watch(clause)
+        return self.ok
+
+    def watch(self, clause):
+        """Watches the first two literals of `clause`."""
+        self.watches.setdefault(clause[0], []).append(clause)
+        self.watches.setdefault(clause[1], []).append(clause)
+
+    def assign(self, literal, reason):
+        """Makes `literal` true at the current level, implied by `reason`."""
+        variable = abs(literal)
+        self.truth[literal] = True
+        self.truth[-literal] = False
+        self.values[variable] = literal > 0
+        self.levels[variable] = len(self.limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def cancel(self, level):
+        """Undoes all assignments made above decision level `level`."""
+        if len(self.limits) <= level:
+            return
+        start = self.limits[level]
+        for literal in self.trail[start:]:
+            variable = abs(literal)
+            self.phases[variable] = literal > 0
+            del self.truth[literal], self.truth[-literal]
+            self.values[variable] = None
+            self.reasons[variable] = None
+            heapq.heappush(self.order, (-self.activity[variable], variable))
+        del self.trail[start:]
+        del self.limits[level:]
+        self.head = len(self.trail)
+
+    def propagate(self):
+        """
+        Assigns every literal implied by unit clauses. Returns a clause
+        whose literals are all false if there is a conflict, else None.
+        """
+        truth = self.truth
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+            watching = self.watches.get(false)
+            if not watching:
+                continue
+
+            kept = []
+            conflict = None
+            for clause in watching:
+                if conflict is not None:
+                    kept.append(clause)
+                    continue
+
+                # Keep the false literal in the second watched position
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                first = truth.get(clause[0])
+                if first is True:
+                    kept.append(clause)
+                    continue
+
+                # Look for another literal to watch instead
+                for k in range(2, len(clause)):
+                    if truth.get(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], false
+                        self.watches.setdefault(clause[1], []).append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if first is False:
+                        conflict = clause
+                    else:
+                        self.assign(clause[0], clause)
+            self.watches[false] = kept
+            if conflict is not None:
+                return conflict
+        return None
+
+    def analyze(self, conflict):
+        """
+        Derives a learnt clause from `conflict` by resolving it back to
+        the first unique implication point. Returns a tuple (clause, level)
+        of the learnt clause, whose first literal becomes unit, and the
+        level to backjump to.
+        """
+        level = len(self.limits)
+        learnt = [None]
+        seen = set()
+        pending = 0
+        literal = None
+        index = len(self.trail) - 1
+        clause = conflict
+        while True:
+            for other in clause:
+                variable = abs(other)
+                if literal is not None and variable == abs(literal):
+                    continue
+                if variable not in seen and self.levels[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if self.levels[variable] == level:
+                        pending += 1
+                    else:
+                        learnt.append(other)
+
+            # Resolve on the latest assigned literal of the current level
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            pending -= 1
+            if not pending:
+                break
+            clause = self.reasons[abs(literal)]
+        learnt[0] = -literal
+
+        if len(learnt) == 1:
+            return learnt, 0
+        deepest = max(
+            range(1, len(learnt)), key=lambda k: self.levels[abs(learnt[k])]
+        )
+        learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+        return learnt, self.levels[abs(learnt[1])]
+
+    def bump(self, variable):
+        """Raises the branching activity of `variable`."""
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+            self.order = [
+                (-activity, variable)
+                for variable, activity in enumerate(self.activity)
+                if variable and self.values[variable] is None
+            ]
+            heapq.heapify(self.order)
+        elif self.values[variable] is None:
+            heapq.heappush(self.order, (-self.activity[variable], variable))
+
+    def choose(self):
+        """
+        Returns the unassigned variable with the highest activity, or None
+        if every variable is assigned. Entries of the order heap that are
+        assigned or hold an outdated activity are skipped.
+        """
+        while self.order:
+            activity, variable = heapq.heappop(self.order)
+            if (self.values[variable] is None
+                    and -activity == self.activity[variable]):
+                return variable
+        return None
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses are satisfiable with every literal in
+        `assumptions` true, storing a satisfying assignment in
+        `self.model`, or False if they are not.
+
+        Assumptions are made as the first decisions, so clauses learnt
+        under them follow from the clauses alone and are kept for later
+        calls.
+        """
+        if not self.ok:
+            return False
+        for literal in assumptions:
+            self.reserve(abs(literal))
+        if self.propagate() is not None:
+            self.ok = False
+            return False
+
+        conflicts = 0
+        limit = RESTART_INTERVAL
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.limits:
+                    self.ok = False
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.cancel(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.learnts.append(learnt)
+                    self.watch(learnt)
+                    self.assign(learnt[0], learnt)
+                self.increment /= ACTIVITY_DECAY
+
+                conflicts += 1
+                if conflicts >= limit:
+                    self.cancel(0)
+                    conflicts = 0
+                    limit *= RESTART_GROWTH
+            elif len(self.limits) < len(assumptions):
+                literal = assumptions[len(self.limits)]
+                value = self.value(literal)
+                if value is False:
+                    self.cancel(0)
+                    return False
+                self.limits.append(len(self.trail))
+                if value is None:
+                    self.assign(literal, None)
+            else:
+                variable = self.choose()
+                if variable is None:
+                    self.model = list(self.values)
+                    self.cancel(0)
+                    return True
+                self.limits.append(len(self.trail))
+                self.assign(variable if self.phases[variable] else -variable,
+                            None)
+
+
+class EntailmentSession():
+    """
+    Answers entailment queries against one knowledge base. The knowledge
+    base is Tseitin encoded and loaded into a solver once, and every query
+    is a solve under assumptions, so clauses learnt for one query are
+    reused by the next.
+    """
+
+    def __init__(self, knowledge):
+        self.cnf = CNF()
+        self.cnf.add(knowledge)
+        self.solver = Solver(self.cnf)
+        self.selectors = dict()
+
+    def entails(self, query):
+        """Checks if the knowledge base entails `query`."""
+        return not self.solver.solve([self.selector(query)])
+
+    def check(self, queries):
+        """Returns whether the knowledge base entails each query."""
+        return [self.entails(query) for query in queries]
+
+    def selector(self, query):
+        """
+        Returns a literal which, when assumed, makes `query` false: the
+        negation of the literal Tseitin encoding `query`. Symbols and
+        negated symbols use their own literal.
+        """
+        if query not in self.selectors:
+            start = len(self.cnf.clauses)
+            literal = -self.cnf.encode(query)
+            for clause in self.cnf.clauses[start:]:
+                self.solver.add_clause(clause)
+            self.selectors[query] = literal
+        return self.selectors[query]
+
+
+class BDD():
+    """
+    Reduced ordered binary decision diagrams over a shared unique table.
+
+    Node 0 is false and node 1 is true. Every other node is a triple
+    (level, low, high), testing the symbol at position `level` of
+    `self.order` and leading to `high` if it is true or `low` otherwise.
+    Symbols missing from the order are appended when first compiled.
+    """
+
+    OPERATIONS = {
+        "and": lambda a, b: a and b,
+        "or": lambda a, b: a or b,
+        "xor": lambda a, b: a != b
+    }
+
+    def __init__(self, order=()):
+        self.order = []
+        self.levels = dict()
+        self.nodes = [(None, None, None), (None, None, None)]
+        self.unique = dict()
+        self.computed = dict()
+        self.compiled = dict()
+        for name in order:
+            self.level(name)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def level(self, name):
+        """Returns the level of symbol `name`, adding it at the bottom."""
+        if name not in self.levels:
+            self.levels[name] = len(self.order)
+            self.order.append(name)
+        return self.levels[name]
+
+    def top(self, u):
+        """Returns the level of node `u`, counting terminals as lowest."""
+        return self.nodes[u][0] if u > 1 else len(self.order)
+
+    def node(self, level, low, high):
+        """Returns the unique node for (level, low, high)."""
+        if low == high:
+            return low
+        key = (level, low, high)
+        if key not in self.unique:
+            self.unique[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self.unique[key]
+
+    def negate(self, u):
+        """Returns the node of the negation of node `u`."""
+        if u < 2:
+            return 1 - u
+        key = ("not", u)
+        if key not in self.computed:
+            level, low, high = self.nodes[u]
+            self.computed[key] = self.node(
+                level, self.negate(low), self.negate(high)
+            )
+        return self.computed[key]
+
+    def apply(self, operation, u, v):
+        """
+        Returns the node of `u` combined with `v` by the binary operation
+        named `operation` ("and", "or" or "xor").
+        """
+        if u < 2 and v < 2:
+            return int(BDD.OPERATIONS[operation](u, v))
+        if operation == "and" and (u == 0 or v == 0):
+            return 0
+        elif operation == "or" and (u == 1 or v == 1):
+            return 1
+        elif u == v:
+            return 0 if operation == "xor" else u
+
+        if u > v:
+            u, v = v, u
+        key = (operation, u, v)
+        if key not in self.computed:
+            level = min(self.top(u), self.top(v))
+            u_low, u_high = self.branches(u, level)
+            v_low, v_high = self.branches(v, level)
+            self.computed[key] = self.node(
+                level,
+                self.apply(operation, u_low, v_low),
+                self.apply(operation, u_high, v_high)
+            )
+        return self.computed[key]
+
+    def branches(self, u, level):
+        """Returns the (low, high) cofactors of `u` on the symbol `level`."""
+        if self.top(u) != level:
+            return u, u
+        return self.nodes[u][1], self.nodes[u][2]
+
+    def compile(self, sentence):
+        """Returns the node representing a logical sentence."""
+        if sentence in self.compiled:
+            return self.compiled[sentence]
+
+        if isinstance(sentence, Symbol):
+            u = self.node(self.level(sentence.name), 0, 1)
+        elif isinstance(sentence, Not):
+            u = self.negate(self.compile(sentence.operand))
+        elif isinstance(sentence, And):
+            u = 1
+            for conjunct in sentence.conjuncts:
+                u = self.apply("and", u, self.compile(conjunct))
+        elif isinstance(sentence, Or):
+            u = 0
+            for disjunct in sentence.disjuncts:
+                u = self.apply("or", u, self.compile(disjunct))
+        elif isinstance(sentence, Implication):
+            u = self.apply(
+                "or",
+                self.negate(self.compile(sentence.antecedent)),
+                self.compile(sentence.consequent)
+            )
+        elif isinstance(sentence, Biconditional):
+            u = self.negate(self.apply(
+                "xor",
+                self.compile(sentence.left),
+                self.compile(sentence.right)
+            ))
+        else:
+            raise TypeError(f"cannot compile {sentence!r}")
+
+        # And can still change through `add`, so its result is not kept
+        if not isinstance(sentence, And):
+            self.compiled[sentence] = u
+        return u
+
+    def condition(self, u, evidence):
+        """
+        Returns the node of `u` with the symbols in `evidence`, a mapping
+        from symbol names to truth values, fixed to those values.
+        """
+        fixed = {
+            self.levels[name]: value for name, value in evidence.items()
+            if name in self.levels
+        }
+        results = {0: 0, 1: 1}
+
+        def restrict(u):
+            if u not in results:
+                level, low, high = self.nodes[u]
+                if level in fixed:
+                    results[u] = restrict(high if fixed[level] else low)
+                else:
+                    results[u] = self.node(
+                        level, restrict(low), restrict(high)
+                    )
+            return results[u]
+
+        return restrict(u)
+
+    def count(self, u):
+        """
+        Returns the number of models of node `u` over all the symbols in
+        `self.order`.
+        """
+        counts = {0: 0, 1: 1}
+
+        def models(u):
+            """Counts models over the symbols from the level of `u` down."""
+            if u not in counts:
+                level, low, high = self.nodes[u]
+                counts[u] = (
+                    models(low) * 2 ** (self.top(low) - level - 1)
+                    + models(high) * 2 ** (self.top(high) - level - 1)
+                )
+            return counts[u]
+
+        return models(u) * 2 ** self.top(u)
+
+    def entails(self, u, query):
+        """
+        Checks if node `u` entails `query`. A symbol, or a negated symbol,
+        is checked by conditioning `u` on the query being false.
+        """
+        if isinstance(query, Symbol):
+            return self.condition(u, {query.name: False}) == 0
+        elif isinstance(query, Not) and isinstance(query.operand, Symbol):
+            return self.condition(u, {query.operand.name: True}) == 0
+        return self.apply("and", u, self.negate(self.compile(query))) == 0
+
+
+def is_true(sentence):
+    """Checks if sentence is the constant true, an empty conjunction."""
+    return isinstance(sentence, And) and not sentence.conjuncts
+
+
+def is_false(sentence):
+    """Checks if sentence is the constant false, an empty disjunction."""
+    return isinstance(sentence, Or) and not sentence.disjuncts
+
+
+def negate(sentence):
+    """Returns the negation of sentence, folding constants."""
+    if isinstance(sentence, Not):
+        return sentence.operand
+    elif is_true(sentence):
+        return Or()
+    elif is_false(sentence):
+        return And()
+    return Not(sentence)
+
+
+def simplify(sentence):
+    """
+    Returns an equivalent sentence with constants folded, nested
+    conjunctions and disjunctions flattened, double negations and repeated
+    operands removed. An empty And stands for true and an empty Or for
+    false.
+
+    Subsentences are simplified in post-order from an explicit stack, so
+    deeply nested sentences do not recurse.
+    """
+    simplified = dict()
+    stack = [(sentence, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in simplified:
+            continue
+        if isinstance(node, Symbol):
+            simplified[id(node)] = node
+            continue
+        children = CNF.children(node)
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+            continue
+        result = fold(node, [simplified[id(child)] for child in children])
+
+        # Hash bottom-up, so that hashing a parent does not recurse
+        hash(result)
+        simplified[id(node)] = result
+    return simplified[id(sentence)]
+
+
+def fold(sentence, operands):
+    """
+    Returns an equivalent of compound `sentence` whose immediate
+    subsentences are replaced by their simplified `operands`.
+    """
+    if isinstance(sentence, Not):
+        return negate(operands[0])
+
+    elif isinstance(sentence, (And, Or)):
+        conjunction = isinstance(sentence, And)
+        absorbing = Or() if conjunction else And()
+        flattened = []
+        seen = set()
+        for operand in operands:
+            if type(operand) is type(sentence):
+                parts = operand.conjuncts if conjunction else operand.disjuncts
+            elif is_false(operand) or is_true(operand):
+                if (is_false(operand)) == conjunction:
+                    return absorbing
+                parts = []
+            else:
+                parts = [operand]
+            for part in parts:
+                if negate(part) in seen:
+                    return absorbing
+                if part not in seen:
+                    seen.add(part)
+                    flattened.append(part)
+        if len(flattened) == 1:
+            return flattened[0]
+        return type(sentence)(*flattened)
+
+    elif isinstance(sentence, Implication):
+        antecedent, consequent = operands
+        if (is_false(antecedent) or is_true(consequent)
+                or antecedent == consequent):
+            return And()
+        elif is_true(antecedent):
+            return consequent
+        elif is_false(consequent):
+            return negate(antecedent)
+        return Implication(antecedent, consequent)
+
+    left, right = operands
+    if left == right:
+        return And()
+    for a, b in ((left, right), (right, left)):
+        if is_true(a):
+            return b
+        elif is_false(a):
+            return negate(b)
+    return Biconditional(left, right)
+
+
+def reduce_clauses(clauses):
+    """
+    Simplifies a list of clauses while preserving satisfiability: drops
+    tautologies and duplicates, fixes the literals of unit clauses and
+    pure literals, and removes clauses subsumed by smaller ones.
+
+    Clauses are indexed by the literals occurring in them, so fixing a
+    literal only visits the clauses that contain it or its negation.
+
+    Returns a list of clauses, which is [()] if they are unsatisfiable.
+    """
+    current = dict()
+    seen = set()
+    for clause in clauses:
+        literals = frozenset(clause)
+        if literals in seen:
+            continue
+        seen.add(literals)
+        if not any(-literal in literals for literal in literals):
+            current[len(current)] = set(literals)
+    occurs = dict()
+    for cid, clause in current.items():
+        for literal in clause:
+            occurs.setdefault(literal, set()).add(cid)
+
+    # Unit and pure literals can be made true without losing models
+    pending = deque(
+        literal for literal, cids in occurs.items()
+        if not occurs.get(-literal)
+    )
+    for clause in current.values():
+        if not clause:
+            return [()]
+        if len(clause) == 1:
+            pending.append(next(iter(clause)))
+    fixed = set()
+
+    def remove(cid):
+        """Removes a clause, queueing the literals it leaves pure."""
+        for literal in current.pop(cid):
+            occurs[literal].discard(cid)
+            if not occurs[literal] and occurs.get(-literal):
+                pending.append(-literal)
+
+    while True:
+        while pending:
+            literal = pending.popleft()
+            if literal in fixed or not occurs.get(literal):
+                continue
+            if -literal in fixed:
+                return [()]
+            fixed.add(literal)
+            for cid in list(occurs[literal]):
+                remove(cid)
+            for cid in list(occurs.get(-literal, ())):
+                clause = current[cid]
+                clause.discard(-literal)
+                occurs[-literal].discard(cid)
+                if not clause:
+                    return [()]
+                if len(clause) == 1:
+                    pending.append(next(iter(clause)))
+
+        # A clause is subsumed by any smaller clause it contains
+        subsumed = []
+        index = dict()
+        for cid in sorted(current, key=lambda cid: len(current[cid])):
+            clause = current[cid]
+            if any(
+                other <= clause
+                for literal in clause
+                for other in index.get(literal, ())
+            ):
+                subsumed.append(cid)
+            else:
+                index.setdefault(min(clause), []).append(clause)
+        if not subsumed:
+            return [tuple(sorted(clause)) for clause in current.values()]
+        for cid in subsumed:
+            remove(cid)
+
+
+def preprocess(sentence, report=False):
+    """
+    Prepares `sentence` for a satisfiability check: simplifies it, encodes
+    it with Tseitin variables and reduces the resulting clauses. The CNF
+    returned is satisfiable exactly when `sentence` is.
+
+    Returns a tuple (cnf, report). With `report`, the report maps
+    "clauses" and "symbols" to pairs of counts before and after
+    preprocessing; otherwise it is None.
+    """
+    cnf = CNF()
+    cnf.add(simplify(sentence))
+    cnf.clauses = reduce_clauses(cnf.clauses)
+    if not report:
+        return cnf, None
+
+    before = CNF()
+    before.add(sentence)
+
+    def count(clauses):
+        return len({abs(literal) for clause in clauses for literal in clause})
+
+    return cnf, {
+        "clauses": (len(before.clauses), len(cnf.clauses)),
+        "symbols": (count(before.clauses), count(cnf.clauses))
+    }
+
+
+def parse(text):
+    """
+    Parses a formula written in the syntax of `Sentence.formula`, with
+    operators ¬, ∧, ∨, => and <=> from tightest to loosest binding.
+
+    Parsing uses explicit operator and operand stacks rather than
+    recursion. Chains of ∧ or ∨ become a single And or Or, and => and <=>
+    group to the right.
+    """
+    operands = []
+    operators = []
+
+    def reduce():
+        operator, arity = operators.pop()
+        if len(operands) < arity:
+            raise ValueError(f"missing operand for {operator} in {text!r}")
+        arguments = operands[len(operands) - arity:]
+        del operands[len(operands) - arity:]
+        if operator == "¬":
+            operands.append(Not(*arguments))
+        elif operator == "∧":
+            operands.append(And(*arguments))
+        elif operator == "∨":
+            operands.append(Or(*arguments))
+        elif operator == "=>":
+            operands.append(Implication(*arguments))
+        else:
+            operands.append(Biconditional(*arguments))
+
+    expect_operand = True
+    for token in TOKEN_PATTERN.findall(text):
+        if token in PRECEDENCE or token in "()":
+            if (token in "(¬") != expect_operand:
+                raise ValueError(f"unexpected {token} in {text!r}")
+        if token == "(" or token == "¬":
+            operators.append([token, 1])
+        elif token == ")":
+            while operators and operators[-1][0] != "(":
+                reduce()
+            if not operators:
+                raise ValueError(f"unbalanced parentheses in {text!r}")
+            operators.pop()
+            expect_operand = False
+        elif token in PRECEDENCE:
+            merged = False
+            while operators and operators[-1][0] != "(":
+                top = operators[-1]
+                if top[0] == token and token in "∧∨":
+                    top[1] += 1
+                    merged = True
+                    break
+                if PRECEDENCE[top[0]] <= PRECEDENCE[token]:
+                    break
+                reduce()
+            if not merged:
+                operators.append([token, 2])
+            expect_operand = True
+        else:
+            name = token.strip()
+            if not name:
+                continue
+            if not expect_operand:
+                raise ValueError(f"unexpected {name} in {text!r}")
+            operands.append(Symbol(name))
+            expect_operand = False
+
+    if expect_operand:
+        raise ValueError(f"incomplete formula {text!r}")
+    while operators:
+        if operators[-1][0] == "(":
+            raise ValueError(f"unbalanced parentheses in {text!r}")
+        reduce()
+    return operands[0]
+
+
+def read_formulas(filename):
+    """
+    Yields the sentence of each formula in a file, one formula per line.
+    Blank lines and lines starting with "#" are skipped.
+    """
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield parse(line)
+
+
+def load_formulas(filename, cnf=None):
+    """
+    Streams the formulas of a file into `cnf` (a new CNF if None) with
+    Tseitin encoding, one formula at a time. Returns the CNF.
+    """
+    cnf = CNF() if cnf is None else cnf
+    for sentence in read_formulas(filename):
+        cnf.add(sentence)
+    return cnf
+
+
+def read_dimacs(filename, cnf=None):
+    """
+    Reads clauses in DIMACS CNF format into `cnf` (a new CNF if None),
+    naming variable `i` of the file by the symbol "i". Clauses go straight
+    into the integer representation, without building sentences.
+    Reading stops at a "%" line, which ends SATLIB files.
+    Returns the CNF.
+    """
+    cnf = CNF() if cnf is None else cnf
+    clause = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("%"):
+                break
+            if not line or line[0] in "cp":
+                continue
+            for token in line.split():
+                literal = int(token)
+                if literal:
+                    variable = cnf.variable(str(abs(literal)))
+                    clause.append(variable if literal > 0 else -variable)
+                elif clause:
+                    cnf.clauses.append(tuple(clause))
+                    clause = []
+    if clause:
+        cnf.clauses.append(tuple(clause))
+    return cnf
 
-        # If model has an assignment for each symbol
-        if not symbols:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
+def model_check(knowledge, query):
+    """
+    Checks if knowledge base entails query. If all the symbols fit in one
+    block of models, they are simply enumerated; otherwise the check is
+    that the preprocessed knowledge base together with the negated query
+    is unsatisfiable.
+    """
+    symbols = set.union(knowledge.symbols(), query.symbols())
+    if len(symbols) <= BLOCK_SYMBOLS:
+        return model_check_enumeration(knowledge, query)
+    cnf, _ = preprocess(And(knowledge, Not(query)))
+    return not Solver(cnf).solve()
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
+def model_check_enumeration(knowledge, query, processes=1):
+    """
+    Checks if knowledge base entails query by enumerating all models.
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+    Models are evaluated bit-parallel in blocks covering every assignment
+    of the first `BLOCK_SYMBOLS` symbols, so only the remaining symbols
+    are enumerated one model block at a time.
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    With more than one process, the remaining symbols are split on their
+    first few values into subtrees that are checked in a process pool.
+    Every worker stops as soon as any of them finds a counter-model.
+    """
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
-
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    inner = symbols[:BLOCK_SYMBOLS]
+    outer = symbols[BLOCK_SYMBOLS:]
+    knowledge = bit_program(knowledge)
+    query = bit_program(query)
+    if processes == 1 or not outer:
+        return check_blocks(knowledge, query, inner, outer, ())
+
+    # Split into a few subtrees per worker so that the load balances
+    split = min(len(outer), (4 * processes - 1).bit_length())
+    event = multiprocessing.Event()
+    with ProcessPoolExecutor(
+        processes, initializer=set_stop_event, initargs=(event,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                check_blocks, knowledge, query, inner, outer, prefix
+            )
+            for prefix in itertools.product((True, False), repeat=split)
+        ]
+        try:
+            for future in as_completed(futures):
+                if not future.result():
+                    event.set()
+                    return False
+        finally:
+            for future in futures:
+                future.cancel()
+    return True
+
+
+def set_stop_event(event):
+    """Initializes a worker process with the shared stop event."""
+    global stop_event
+    stop_event = event
+
+
+def check_blocks(knowledge, query, inner, outer, prefix):
+    """
+    Checks if knowledge base entails query, both flattened by
+    `bit_program`, in every model where the first symbols of `outer` have
+    the values in `prefix`, enumerating the rest of `outer` one block of
+    models over `inner` at a time.
+    """
+    full = (1 << (1 << len(inner))) - 1
+    masks = {
+        symbol: symbol_mask(k, len(inner)) for k, symbol in enumerate(inner)
+    }
+    masks.update(
+        (symbol, full if value else 0) for symbol, value in zip(outer, prefix)
+    )
+    remaining = outer[len(prefix):]
+
+    # In every model where knowledge base is true, query must also be true
+    for values in itertools.product((full, 0), repeat=len(remaining)):
+        if stop_event is not None and stop_event.is_set():
+            return True
+        masks.update(zip(remaining, values))
+        counter_models = (evaluate_program(knowledge, masks, full)
+                          & ~evaluate_program(query, masks, full))
+        if counter_models:
+            return False
+    return True
+
+
+def bit_program(sentence):
+    """
+    Flattens `sentence` for `evaluate_program`. Returns the list of its
+    distinct subsentences in post-order, ending with `sentence`, each as a
+    tuple (cls, argument): the argument of a symbol is its name, and of a
+    compound sentence the positions of its immediate subsentences.
+
+    The list is built from an explicit stack and holds no sentences, so
+    neither building, evaluating nor pickling it recurses.
+    """
+    program = []
+    positions = dict()
+    stack = [(sentence, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in positions:
+            continue
+        if isinstance(node, Symbol):
+            entry = (Symbol, node.name)
+        else:
+            children = CNF.children(node)
+            if not ready:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children)
+                continue
+            entry = (type(node), [positions[id(child)] for child in children])
+        positions[id(node)] = len(program)
+        program.append(entry)
+    return program
+
+
+def evaluate_program(program, masks, full):
+    """
+    Evaluates a sentence flattened by `bit_program` in a block of models,
+    as `Sentence.evaluate_bits` does.
+    """
+    values = []
+    for cls, argument in program:
+        if cls is Symbol:
+            try:
+                value = masks[argument]
+            except KeyError:
+                raise Exception(f"variable {argument} not in model")
+        elif issubclass(cls, Not):
+            value = full ^ values[argument[0]]
+        elif issubclass(cls, And):
+            value = full
+            for position in argument:
+                value &= values[position]
+        elif issubclass(cls, Or):
+            value = 0
+            for position in argument:
+                value |= values[position]
+        elif issubclass(cls, Implication):
+            value = (full ^ values[argument[0]]) | values[argument[1]]
+        else:
+            value = full ^ values[argument[0]] ^ values[argument[1]]
+        values.append(value)
+    return values[-1]
+
+
+def symbol_mask(k, n):
+    """
+    Returns the bitmask over all 2 ** n models of n symbols in which symbol
+    `k` is true, where bit `i` stands for the model whose `k`th symbol has
+    the value of the `k`th bit of `i`.
+    """
+    run = 1 << k
+    mask = ((1 << run) - 1) << run
+    width = 2 * run
+    while width < (1 << n):
+        mask |= mask << width
+        width *= 2
+    return mask
@@ -75,8 +75,9 @@ def main():
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
-            for symbol in symbols:
-                if model_check(knowledge, symbol):
+            session = EntailmentSession(knowledge)
+            for symbol, entailed in zip(symbols, session.check(symbols)):
+                if entailed:
                     print(f"    {symbol}")
 
 
@@ -1,7 +1,7 @@
 import itertools
 import random
+from collections import deque
 # from runner import WIDTH
-from sys import winver
 
 
 class Minesweeper():
@@ -157,8 +157,83 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Sentences about the game known to be true, by id, indexed by
+        # their set of cells and by each cell they contain
+        self.sentences = dict()
+        self.by_cells = dict()
+        self.containing = dict()
+        self.next_id = 0
+
+        # Ids of sentences added or changed since inference last ran
+        self.pending = deque()
+        self.queued = set()
+
+    @property
+    def knowledge(self):
+        """
+        Tuple of sentences about the game known to be true. It is a
+        read-only snapshot of the indexed sentences: add one with
+        `add_sentence` (and `infer` to draw its conclusions), or assign a
+        new list of sentences to replace them all. The sentences must not
+        be changed in place.
+        """
+        return tuple(self.sentences.values())
+
+    @knowledge.setter
+    def knowledge(self, sentences):
+        self.sentences = dict()
+        self.by_cells = dict()
+        self.containing = dict()
+        self.pending = deque()
+        self.queued = set()
+        for sentence in sentences:
+            self.add_sentence(sentence.cells, sentence.count)
+
+    def add_sentence(self, cells, count):
+        """
+        Adds the sentence that `count` of `cells` are mines to the
+        knowledge base, unless it has no cells or is already known.
+        """
+        key = frozenset(cells)
+        if not key or key in self.by_cells:
+            return
+        sid = self.next_id
+        self.next_id += 1
+        self.sentences[sid] = Sentence(cells, count)
+        self.by_cells[key] = sid
+        for cell in key:
+            self.containing.setdefault(cell, set()).add(sid)
+        self.enqueue(sid)
+
+    def remove_sentence(self, sid):
+        """
+        Removes a sentence, already taken out of `by_cells`, from the
+        knowledge base.
+        """
+        for cell in self.sentences.pop(sid).cells:
+            self.containing[cell].discard(sid)
+
+    def update_sentences(self, cell, update):
+        """
+        Applies `update` to every sentence containing `cell`, dropping the
+        sentences left empty or equal to another one.
+        """
+        for sid in self.containing.pop(cell, ()):
+            sentence = self.sentences[sid]
+            del self.by_cells[frozenset(sentence.cells)]
+            update(sentence)
+            key = frozenset(sentence.cells)
+            if not key or key in self.by_cells:
+                self.remove_sentence(sid)
+            else:
+                self.by_cells[key] = sid
+                self.enqueue(sid)
+
+    def enqueue(self, sid):
+        """Queues a sentence for `infer` to examine."""
+        if sid not in self.queued:
+            self.queued.add(sid)
+            self.pending.append(sid)
 
     def mark_mine(self, cell):
         """
@@ -166,8 +241,7 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.update_sentences(cell, lambda sentence: sentence.mark_mine(cell))
 
     def mark_safe(self, cell):
         """
@@ -175,8 +249,7 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        self.update_sentences(cell, lambda sentence: sentence.mark_safe(cell))
 
     def add_knowledge(self, cell, count):
         """
@@ -206,44 +279,47 @@ class MinesweeperAI():
                     else : 
                         adj = (i,j)
                         cells.add(adj)
-        new = Sentence(cells,count)
-        print(new)
-        if len(new.cells):
-            self.knowledge.append(new)
-        
-        new_safes = set()
-        new_mines = set()
-        for sentence in self.knowledge:
-            for safe in sentence.known_safes() :
-                new_safes.add(safe)
-            for mine in sentence.known_mines() : 
-                new_mines.add(mine)
-        for safe in new_safes :
-            self.mark_safe(safe)
-        for mine in new_mines:
-            self.mark_mine(mine)
-
-        remove = []
-        for sentence in self.knowledge :
-            if len(sentence.cells) == 0: remove.append(sentence)
-        for sentence in remove : 
-            self.knowledge.remove(sentence)
-
-
-        temp = []
-        for sentence in self.knowledge : 
-            if sentence.cells != new.cells :
-                if sentence.cells.issubset(new.cells) :
-                    t = Sentence(new.cells - sentence.cells,new.count - sentence.count)
-                    temp.append(t)
-                elif new.cells.issubset(sentence.cells) :
-                    t = Sentence(sentence.cells-new.cells,sentence.count - new.count)
-                    temp.append(t)
-        self.knowledge+=temp
-
-        # for sentence in self.knowledge:
-        #     print(sentence)
-        # raise NotImplementedError
+        self.add_sentence(cells, count)
+        self.infer()
+
+    def infer(self):
+        """
+        Draws every conclusion that follows from the queued sentences,
+        until nothing new follows.
+
+        A queued sentence whose cells are all safe or all mines marks
+        them, which queues the other sentences containing them. Otherwise
+        it is compared with the sentences sharing a cell with it, and when
+        one has a subset of the other's cells, the sentence about the
+        remaining cells is added.
+        """
+        while self.pending:
+            sid = self.pending.popleft()
+            self.queued.discard(sid)
+            if sid not in self.sentences:
+                continue
+            sentence = self.sentences[sid]
+
+            mines = sentence.known_mines()
+            safes = sentence.known_safes()
+            if mines or safes:
+                for mine in list(mines):
+                    self.mark_mine(mine)
+                for safe in list(safes):
+                    self.mark_safe(safe)
+                continue
+
+            others = set()
+            for cell in sentence.cells:
+                others.update(self.containing[cell])
+            others.discard(sid)
+            for other in [self.sentences[oid] for oid in others]:
+                if other.cells < sentence.cells:
+                    self.add_sentence(sentence.cells - other.cells,
+                                      sentence.count - other.count)
+                elif sentence.cells < other.cells:
+                    self.add_sentence(other.cells - sentence.cells,
+                                      other.count - sentence.count)
 
     def make_safe_move(self):
         """
@@ -1,55 +1,261 @@
+import mmap
+import operator
 import os
 import random
 import re
+import struct
 import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 DAMPING = 0.85
 SAMPLES = 10000
+BATCH_SIZE = 4096
+TOLERANCE = 0.001
+MAX_ITERATIONS = 1000
+
+CHUNK_SIZE = 1 << 16
+PARALLEL_THRESHOLD = 64
+CACHE_NAME = ".linkcache"
+CACHE_MAGIC = b"PRLINKS1"
+CACHE_HEADER = struct.Struct("<8sIIQ")
+BLOCK_SIZE = 1 << 16
+EXTRAPOLATION_PERIOD = 10
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
-    if len(sys.argv) != 2:
-        print(sys.argv)
-        sys.exit("Usage: python pagerank.py corpus")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python pagerank.py corpus [solver]")
+    solver = sys.argv[2] if len(sys.argv) == 3 else "power"
+    if solver not in SOLVERS:
+        sys.exit(f"Unknown solver {solver}, choose from {', '.join(SOLVERS)}")
     corpus = crawl(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    return
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    graph = LinkGraph(corpus)
+    values, iterations = SOLVERS[solver](graph, DAMPING)
+    ranks = graph.ranks(values)
+    print(f"PageRank Results from Iteration ({solver})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if solver != "power":
+        _, baseline = power_iteration(graph, DAMPING)
+        saved = baseline - iterations
+        print(f"Converged in {iterations} iterations, {abs(saved)} "
+              f"{'fewer' if saved >= 0 else 'more'} than power iteration")
+    else:
+        print(f"Converged in {iterations} iterations")
 
 
-def crawl(directory):
+def crawl(directory, processes=None, cache=True):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Files are parsed in a pool of `processes` worker processes when there
+    are enough of them to be worth it. If `cache` is True, the link graph
+    is kept in a binary cache file inside `directory`, and only files whose
+    modification time or size changed since the last crawl are parsed.
     """
-    pages = dict()
+    stamps = dict()
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".html") and entry.is_file():
+            stat = entry.stat()
+            stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+    # Reuse links of files that have not changed since they were cached
+    cache_path = os.path.join(directory, CACHE_NAME)
+    cached = read_link_cache(cache_path) if cache else dict()
+    links = dict()
+    for filename, stamp in stamps.items():
+        if filename in cached and cached[filename][0] == stamp:
+            links[filename] = cached[filename][1]
+    stale = sorted(filename for filename in stamps if filename not in links)
 
     # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    paths = [os.path.join(directory, filename) for filename in stale]
+    if processes != 1 and len(paths) >= PARALLEL_THRESHOLD:
+        workers = processes or os.cpu_count() or 1
+        chunksize = max(1, len(paths) // (4 * workers))
+        with ProcessPoolExecutor(workers) as executor:
+            parsed = list(
+                executor.map(parse_links, paths, chunksize=chunksize)
+            )
+    else:
+        parsed = [parse_links(path) for path in paths]
+    links.update(zip(stale, parsed))
+
+    if cache and (stale or cached.keys() != stamps.keys()):
+        try:
+            write_link_cache(cache_path, stamps, links)
+        except OSError:
+            pass
 
     # Only include links to other pages in the corpus
-    for filename in pages:
+    pages = dict()
+    for filename in links:
         pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
+            link for link in links[filename]
+            if link in links and link != filename
         )
 
     return pages
 
 
+def parse_links(path):
+    """
+    Return the set of link targets found in the HTML file at `path`.
+
+    The file is read in chunks of `CHUNK_SIZE` characters. Text after the
+    last "<" of a chunk may belong to an unfinished tag, so it is carried
+    over into the next chunk instead of being matched.
+    """
+    links = set()
+    pending = ""
+    with open(path) as f:
+        while chunk := f.read(CHUNK_SIZE):
+            buffer = pending + chunk
+            cut = max(buffer.rfind("<"), 0)
+            links.update(LINK_PATTERN.findall(buffer, 0, cut))
+            pending = buffer[cut:]
+    links.update(LINK_PATTERN.findall(pending))
+    return links
+
+
+def read_link_cache(path):
+    """
+    Load a link cache written by `write_link_cache`. Return a dictionary
+    mapping each cached filename to a tuple (stamp, links), or an empty
+    dictionary if the cache is missing or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            magic, names, files, size = CACHE_HEADER.unpack(
+                f.read(CACHE_HEADER.size)
+            )
+            if magic != CACHE_MAGIC:
+                return dict()
+            table = f.read(size).decode().split("\0") if names else []
+
+            file_ids = read_array(f, "i", files)
+            mtimes = read_array(f, "q", files)
+            sizes = read_array(f, "q", files)
+            offsets = read_array(f, "q", files + 1)
+            targets = read_array(f, "i", offsets[-1])
+    except (OSError, EOFError, ValueError, struct.error):
+        return dict()
+    if len(table) != names:
+        return dict()
+
+    cached = dict()
+    for k in range(files):
+        links = set(table[i] for i in targets[offsets[k]:offsets[k + 1]])
+        cached[table[file_ids[k]]] = ((mtimes[k], sizes[k]), links)
+    return cached
+
+
+def write_link_cache(path, stamps, links):
+    """
+    Write the raw links of each file to a binary cache at `path`.
+
+    The cache holds a table of every page name (files and link targets)
+    followed by the file stamps and the links as CSR edge arrays of ids.
+    """
+    table = sorted(set(stamps).union(*links.values()))
+    ids = {name: i for i, name in enumerate(table)}
+    files = sorted(stamps)
+
+    offsets = array("q", [0])
+    targets = array("i")
+    for filename in files:
+        targets.extend(sorted(ids[link] for link in links[filename]))
+        offsets.append(len(targets))
+    encoded = "\0".join(table).encode()
+
+    temporary = f"{path}.{os.getpid()}"
+    with open(temporary, "wb") as f:
+        f.write(CACHE_HEADER.pack(
+            CACHE_MAGIC, len(table), len(files), len(encoded)
+        ))
+        f.write(encoded)
+        array("i", (ids[filename] for filename in files)).tofile(f)
+        array("q", (stamps[filename][0] for filename in files)).tofile(f)
+        array("q", (stamps[filename][1] for filename in files)).tofile(f)
+        offsets.tofile(f)
+        targets.tofile(f)
+    os.replace(temporary, path)
+
+
+def read_array(f, typecode, n):
+    """Read an array of `n` items of type `typecode` from file `f`."""
+    values = array(typecode)
+    values.fromfile(f, n)
+    return values
+
+
+class LinkGraph():
+    """
+    Array-backed link matrix for a corpus, built once from `crawl` output.
+
+    Pages are numbered 0..N-1 in sorted order. Links are stored in CSR
+    layout sorted by source: the pages linked to by page `i` are
+    `targets[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, corpus):
+        self.pages = sorted(corpus)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.offsets = array("q", [0])
+        self.targets = array("i")
+        for page in self.pages:
+            links = sorted(self.index[link] for link in corpus[page])
+            self.targets.extend(links)
+            self.offsets.append(len(self.targets))
+
+        # Pages without links are treated as linking to every page
+        self.dangling = array("i", (
+            i for i in range(len(self.pages))
+            if self.offsets[i] == self.offsets[i + 1]
+        ))
+        self._incoming = None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def ranks(self, values):
+        """Map a rank vector indexed by page id back to page names."""
+        return dict(zip(self.pages, values))
+
+    def incoming(self):
+        """
+        Return the transposed link matrix as a tuple (offsets, sources),
+        where the pages linking to page `i` are
+        `sources[offsets[i]:offsets[i + 1]]`. Built on first use.
+        """
+        if self._incoming is None:
+            N = len(self.pages)
+            counts = [0] * (N + 1)
+            for j in self.targets:
+                counts[j + 1] += 1
+            offsets = array("q", counts)
+            for i in range(N):
+                offsets[i + 1] += offsets[i]
+
+            sources = array("i", [0]) * len(self.targets)
+            position = list(offsets[:N])
+            for i in range(N):
+                for j in self.targets[self.offsets[i]:self.offsets[i + 1]]:
+                    sources[position[j]] = i
+                    position[j] += 1
+            self._incoming = (offsets, sources)
+        return self._incoming
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -79,42 +285,677 @@ def transition_model(corpus, page, damping_factor):
     raise NotImplementedError
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, walkers=1):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
 
+    The samples are shared between `walkers` independent random surfers,
+    each starting on its own random page.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    pr = dict(zip(corpus.keys(), [0]*len(corpus)))
-    page = random.choice(list(corpus.keys()))
-    for _ in range(n):
-        pr[page] +=1
-        pd = transition_model(corpus,page,damping_factor)
-        page = random.choices(list(pd.keys()),pd.values())[0]
-    pr = {page : num_samples/n for page,num_samples in pr.items()}
-    return pr
-    raise NotImplementedError
+    graph = LinkGraph(corpus)
+    counts = random_walk(graph, damping_factor, n, walkers)
+    return graph.ranks(count / n for count in counts)
 
 
-def iterate_pagerank(corpus, damping_factor):
+def random_walk(graph, damping_factor, n, walkers=1):
+    """
+    Take `n` steps in total with `walkers` random surfers over `graph`,
+    and return how many times each page id was visited.
+
+    Each step costs O(1): the CSR offsets of `graph` already act as the
+    cumulative table for choosing a link uniformly, so the transition
+    model never has to be materialised. Every step uses a single random
+    number, drawn in batches of `BATCH_SIZE`.
+    """
+    N = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    counts = [0] * N
+    walkers = max(1, min(walkers, n))
+
+    positions = [random.randrange(N) for _ in range(walkers)]
+    for position in positions:
+        counts[position] += 1
+    remaining = n - walkers
+
+    while remaining > 0:
+        draws = [random.random() for _ in range(min(BATCH_SIZE, remaining))]
+        remaining -= len(draws)
+        for k, u in enumerate(draws):
+            w = k % walkers
+            page = positions[w]
+            start, end = offsets[page], offsets[page + 1]
+
+            # With probability `damping_factor` follow a link, otherwise
+            # jump anywhere; the rescaled draw picks the link or page
+            if start == end:
+                page = int(u * N)
+            elif u < damping_factor:
+                link = int(u / damping_factor * (end - start))
+                page = targets[min(start + link, end - 1)]
+            else:
+                page = int((u - damping_factor) / (1 - damping_factor) * N)
+            page = min(page, N - 1)
+            positions[w] = page
+            counts[page] += 1
+    return counts
+
+
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                     max_iterations=MAX_ITERATIONS):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until convergence: the L1 change between iterations
+    is below `tolerance`, or `max_iterations` iterations have been run.
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    N=len(corpus)
-    pd = dict(zip(corpus.keys(),[1/N]*N))
-    pd_dx = dict(zip(corpus.keys(),[1/N]*N))
+    graph = LinkGraph(corpus)
+    ranks, _ = power_iteration(
+        graph, damping_factor, tolerance, max_iterations
+    )
+    return graph.ranks(ranks)
 
-    while any(dx>0.001 for dx in pd_dx.values()):
-        pass
-    raise NotImplementedError
+
+def power_step(graph, ranks, damping_factor):
+    """
+    Apply the PageRank update once to the rank vector `ranks`, returning
+    the new rank vector.
+
+    The rank held by dangling pages is spread over the whole corpus as a
+    single rank-one correction rather than as explicit links.
+    """
+    N = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+
+    dangling = sum(ranks[i] for i in graph.dangling)
+    base = (1 - damping_factor) / N + damping_factor * dangling / N
+    new = [base] * N
+    for i in range(N):
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
+            continue
+        share = damping_factor * ranks[i] / (end - start)
+        for j in targets[start:end]:
+            new[j] += share
+    return new
+
+
+def power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, ranks=None):
+    """
+    Run power iteration over `graph` until the L1 distance between
+    successive rank vectors drops below `tolerance`, or `max_iterations`
+    updates have been made.
+
+    Start from `ranks` if given, otherwise from the uniform distribution.
+    Return a tuple (ranks, iterations).
+    """
+    N = len(graph)
+    if ranks is None:
+        ranks = [1 / N] * N
+
+    iterations = 0
+    while iterations < max_iterations:
+        new = power_step(graph, ranks, damping_factor)
+        iterations += 1
+        delta = sum(abs(a - b) for a, b in zip(new, ranks))
+        ranks = new
+        if delta < tolerance:
+            break
+    return ranks, iterations
+
+
+def gauss_seidel(graph, damping_factor, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, ranks=None):
+    """
+    Solve for PageRank with Gauss-Seidel sweeps: each page's rank is
+    updated in place from the incoming links, so later pages in a sweep
+    already see the new ranks of earlier ones.
+
+    Stop once a sweep changes the ranks by less than `tolerance` in L1
+    distance. Return a tuple (ranks, iterations).
+    """
+    N = len(graph)
+    offsets, sources = graph.incoming()
+    degree = [graph.offsets[i + 1] - graph.offsets[i] for i in range(N)]
+    is_dangling = [not d for d in degree]
+    ranks = [1 / N] * N if ranks is None else list(ranks)
+    shares = [rank / d if d else 0 for rank, d in zip(ranks, degree)]
+    mass = sum(ranks[i] for i in graph.dangling)
+
+    iterations = 0
+    while iterations < max_iterations:
+        delta = 0
+        for i in range(N):
+            total = sum(shares[j] for j in sources[offsets[i]:offsets[i + 1]])
+            value = (1 - damping_factor) / N + damping_factor * (
+                total + mass / N
+            )
+            delta += abs(value - ranks[i])
+            if is_dangling[i]:
+                mass += value - ranks[i]
+            else:
+                shares[i] = value / degree[i]
+            ranks[i] = value
+
+        # In-place updates do not preserve the total, so renormalise
+        total = sum(ranks)
+        ranks = [rank / total for rank in ranks]
+        shares = [share / total for share in shares]
+        mass /= total
+        iterations += 1
+        if delta < tolerance:
+            break
+    return ranks, iterations
+
+
+def extrapolated_power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                                 max_iterations=MAX_ITERATIONS, ranks=None):
+    """
+    Run power iteration, applying vector Aitken extrapolation to the last
+    three iterates every `EXTRAPOLATION_PERIOD` iterations to cancel the
+    slowest decaying error component.
+
+    The step taken from an extrapolated vector is kept only if it leaves a
+    smaller residual than plain iteration would have. Otherwise it is
+    discarded, and the wait before the next extrapolation is doubled, as
+    the error does not have a single dominant component to cancel yet.
+
+    Return a tuple (ranks, iterations).
+    """
+    N = len(graph)
+    history = [[1 / N] * N if ranks is None else list(ranks)]
+    period = EXTRAPOLATION_PERIOD
+    due = period
+
+    iterations = 0
+    while iterations < max_iterations:
+        new = power_step(graph, history[-1], damping_factor)
+        iterations += 1
+        delta = sum(abs(a - b) for a, b in zip(new, history[-1]))
+        history = history[-2:] + [new]
+        if delta < tolerance:
+            break
+
+        if iterations < due or iterations >= max_iterations:
+            continue
+        due = iterations + period
+        x0, x1, x2 = history
+        d1 = [b - a for a, b in zip(x0, x1)]
+        d2 = [b - a for a, b in zip(x1, x2)]
+        norm = sum(a * a for a in d1)
+        ratio = sum(a * b for a, b in zip(d1, d2)) / norm if norm else 0
+        if not 0 < abs(ratio) < 1:
+            continue
+
+        # Errors shrinking by `ratio` each step sum to this past x2
+        factor = ratio / (1 - ratio)
+        candidate = [max(x + factor * d, 0) for x, d in zip(x2, d2)]
+        total = sum(candidate)
+        candidate = [value / total for value in candidate]
+        step = power_step(graph, candidate, damping_factor)
+        iterations += 1
+        residual = sum(abs(a - b) for a, b in zip(step, candidate))
+        if residual < abs(ratio) * delta:
+            history = [candidate, step]
+            if residual < tolerance:
+                break
+        else:
+            period *= 2
+            due = iterations + period
+    return history[-1], iterations
+
+
+def adaptive_power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                             max_iterations=MAX_ITERATIONS, ranks=None):
+    """
+    Solve for PageRank by only recomputing the pages whose inputs changed.
+
+    With the rank of dangling pages spread uniformly, PageRank is the
+    normalised solution of c = 1 + damping_factor * A c, where A only holds
+    the links, so unlike the rank vector no term couples every page. Each
+    page keeps the change of its inputs not yet applied to it, and a sweep
+    only updates the pages where that residual is at least
+    `tolerance * (1 - damping_factor)` times the mean of c, passing the
+    change on along their links. The residuals left then bound the L1 error
+    of the normalised ranks by `tolerance`.
+
+    Return a tuple (ranks, iterations), where iterations is the number of
+    page updates made divided by N, so that it compares with full sweeps.
+    """
+    N = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    scale = tolerance * (1 - damping_factor) / N
+
+    if ranks is None:
+        values = [0.0] * N
+        residuals = [1.0] * N
+    else:
+        # Scale the ranks to a solution of the unnormalised equation
+        mass = sum(ranks[i] for i in graph.dangling)
+        base = (1 - damping_factor + damping_factor * mass) / N
+        values = [rank / base for rank in ranks]
+        residuals = [1 - value for value in values]
+        for i in range(N):
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                continue
+            share = damping_factor * values[i] / (end - start)
+            for j in targets[start:end]:
+                residuals[j] += share
+
+    # The total only grows from zero, staying below the one of the solution
+    total = sum(values)
+    threshold = scale * max(total, N)
+    active = [i for i in range(N) if abs(residuals[i]) >= threshold]
+    updates = 0
+    while active and updates < max_iterations * N:
+        pending = set()
+        for i in active:
+            change = residuals[i]
+            if abs(change) < threshold:
+                continue
+            values[i] += change
+            residuals[i] = 0
+            total += change
+            updates += 1
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                continue
+            share = damping_factor * change / (end - start)
+            for j in targets[start:end]:
+                residuals[j] += share
+                if abs(residuals[j]) >= threshold:
+                    pending.add(j)
+        threshold = scale * max(total, N)
+        active = sorted(pending)
+
+    total = sum(values)
+    return [value / total for value in values], -(-updates // N)
+
+
+def personalized_pagerank(corpus, damping_factor, personalizations,
+                          tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return topic-sensitive PageRank values for a batch of personalizations.
+
+    `personalizations` maps a name to either a set of seed pages or a
+    dictionary of page weights. With probability `1 - damping_factor`, and
+    from dangling pages, the surfer jumps according to that distribution
+    instead of uniformly. All personalizations are computed together, so
+    each iteration takes a single pass over the links.
+
+    Return a dictionary mapping each name to a dictionary of PageRank
+    values for each page.
+    """
+    graph = LinkGraph(corpus)
+    names = list(personalizations)
+    teleports = [
+        teleport_vector(graph, personalizations[name]) for name in names
+    ]
+    columns, _ = batch_power_iteration(
+        graph, damping_factor, teleports, tolerance, max_iterations
+    )
+    return {
+        name: graph.ranks(column) for name, column in zip(names, columns)
+    }
+
+
+def teleport_vector(graph, personalization):
+    """
+    Return the teleport distribution over page ids for `personalization`,
+    either a set of seed pages or a dictionary of page weights.
+    """
+    if not isinstance(personalization, dict):
+        personalization = dict.fromkeys(personalization, 1)
+    total = sum(personalization.values())
+    if total <= 0:
+        raise ValueError("personalization must have positive weight")
+
+    vector = [0] * len(graph)
+    for page, weight in personalization.items():
+        vector[graph.index[page]] = weight / total
+    return vector
+
+
+def batch_power_iteration(graph, damping_factor, teleports,
+                          tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Run power iteration for several teleport distributions at once.
+
+    Ranks are kept as one flat page-major list holding every column of a
+    page side by side, so that each link is visited once per iteration for
+    all columns. Iterate until every column's L1 change is below
+    `tolerance`, or `max_iterations` updates have been made.
+
+    Return a tuple (columns, iterations), where `columns` holds one rank
+    vector per teleport distribution.
+    """
+    N = len(graph)
+    K = len(teleports)
+    offsets = graph.offsets
+    targets = graph.targets
+    rows = [[teleport[j] for teleport in teleports] for j in range(N)]
+    ranks = [value for row in rows for value in row]
+
+    iterations = 0
+    while iterations < max_iterations:
+        dangling = [0] * K
+        for i in graph.dangling:
+            dangling = list(
+                map(operator.add, dangling, ranks[i * K:i * K + K])
+            )
+        scale = [
+            (1 - damping_factor) + damping_factor * mass for mass in dangling
+        ]
+        new = [
+            value for row in rows for value in map(operator.mul, row, scale)
+        ]
+
+        for i in range(N):
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                continue
+            factor = damping_factor / (end - start)
+            shares = [factor * rank for rank in ranks[i * K:i * K + K]]
+            for j in targets[start:end]:
+                new[j * K:j * K + K] = map(
+                    operator.add, new[j * K:j * K + K], shares
+                )
+
+        iterations += 1
+        deltas = [0] * K
+        for k, (a, b) in enumerate(zip(new, ranks)):
+            deltas[k % K] += abs(a - b)
+        ranks = new
+        if max(deltas, default=0) < tolerance:
+            break
+
+    columns = [ranks[k::K] for k in range(K)]
+    return columns, iterations
+
+
+def write_edge_arrays(corpus, directory):
+    """
+    Write the link graph of `corpus` to `directory` as files for
+    `mmap_pagerank`: the page names one per line in "pages.txt", and the
+    links as CSR arrays sorted by source in "offsets.bin" (int64) and
+    "targets.bin" (int32).
+
+    Links are written one page at a time, so `corpus` may be any mapping
+    that produces them lazily.
+    """
+    os.makedirs(directory, exist_ok=True)
+    pages = sorted(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    with open(os.path.join(directory, "pages.txt"), "w") as f:
+        f.writelines(f"{page}\n" for page in pages)
+
+    offsets = array("q", [0])
+    with open(os.path.join(directory, "targets.bin"), "wb") as f:
+        for page in pages:
+            links = array("i", sorted(index[link] for link in corpus[page]))
+            links.tofile(f)
+            offsets.append(offsets[-1] + len(links))
+    with open(os.path.join(directory, "offsets.bin"), "wb") as f:
+        offsets.tofile(f)
+
+
+def mmap_pagerank(directory, damping_factor, tolerance=TOLERANCE,
+                  max_iterations=MAX_ITERATIONS, block_size=BLOCK_SIZE):
+    """
+    Run power iteration over the link graph stored in `directory` by
+    `write_edge_arrays`, without loading the links into memory.
+
+    The edge arrays are memory-mapped and streamed `block_size` source pages
+    at a time, so only the rank vectors take O(N) memory. Ranks are written
+    as float64 values to the memory-mapped file "ranks.bin" in `directory`.
+
+    Return the number of iterations made.
+    """
+    offsets_map = map_file(os.path.join(directory, "offsets.bin"))
+    offsets = memoryview(offsets_map).cast("q")
+    N = len(offsets) - 1
+    targets_map = map_file(os.path.join(directory, "targets.bin"))
+    targets = memoryview(targets_map or b"").cast("i")
+    dangling = array("i", (
+        i for i in range(N) if offsets[i] == offsets[i + 1]
+    ))
+
+    with open(os.path.join(directory, "ranks.bin"), "w+b") as f:
+        f.truncate(N * array("d").itemsize)
+        ranks_map = mmap.mmap(f.fileno(), 0)
+    ranks = memoryview(ranks_map).cast("d")
+    ranks[:] = array("d", [1 / N]) * N
+
+    iterations = 0
+    while iterations < max_iterations:
+        mass = sum(ranks[i] for i in dangling)
+        base = (1 - damping_factor) / N + damping_factor * mass / N
+        new = array("d", [base]) * N
+
+        # Stream over the links one block of source pages at a time
+        for first in range(0, N, block_size):
+            last = min(first + block_size, N)
+            block = targets[offsets[first]:offsets[last]]
+            for i in range(first, last):
+                start = offsets[i] - offsets[first]
+                end = offsets[i + 1] - offsets[first]
+                if start == end:
+                    continue
+                share = damping_factor * ranks[i] / (end - start)
+                for j in block[start:end]:
+                    new[j] += share
+            block.release()
+
+        iterations += 1
+        delta = sum(abs(a - b) for a, b in zip(new, ranks))
+        ranks[:] = new
+        if delta < tolerance:
+            break
+
+    for view in (ranks, targets, offsets):
+        view.release()
+    ranks_map.flush()
+    for mapped in (ranks_map, targets_map, offsets_map):
+        if mapped is not None:
+            mapped.close()
+    return iterations
+
+
+def map_file(path):
+    """
+    Memory-map the file at `path` read-only, returning None if it is empty.
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_ranks(directory):
+    """
+    Return the PageRank values written to `directory` by `mmap_pagerank`
+    as a dictionary mapping page names to values.
+    """
+    with open(os.path.join(directory, "pages.txt")) as f:
+        pages = f.read().splitlines()
+    ranks = array("d")
+    with open(os.path.join(directory, "ranks.bin"), "rb") as f:
+        ranks.fromfile(f, len(pages))
+    return dict(zip(pages, ranks))
+
+
+def diff_corpus(old, new):
+    """
+    Compare two corpora returned by `crawl`.
+
+    Return a dictionary with the sets "added_pages" and "removed_pages",
+    and the sets "added_links" and "removed_links" of (source, target)
+    pairs. Links of added or removed pages are included.
+    """
+    diff = {
+        "added_pages": new.keys() - old.keys(),
+        "removed_pages": old.keys() - new.keys(),
+        "added_links": set(),
+        "removed_links": set()
+    }
+    for page in old.keys() | new.keys():
+        before = old.get(page, set())
+        after = new.get(page, set())
+        if before != after:
+            diff["added_links"].update((page, link) for link in after - before)
+            diff["removed_links"].update(
+                (page, link) for link in before - after
+            )
+    return diff
+
+
+def update_pagerank(corpus, ranks, diff, damping_factor, tolerance=TOLERANCE):
+    """
+    Return PageRank values for the changed corpus `corpus`, given the
+    PageRank values `ranks` of the corpus before the change and the
+    `diff` between the two corpora as returned by `diff_corpus`.
+
+    Iteration is warm-started from `ranks`. Only pages whose incoming links
+    changed start with a residual (besides a uniform shift shared by every
+    page), and residuals are pushed along links until none is above
+    `tolerance / N`, so the work stays within the changed region.
+    """
+    graph = LinkGraph(corpus)
+    N = len(graph)
+    index = graph.index
+
+    # Recover the links of changed pages before the change
+    added = dict()
+    removed = dict()
+    for source, target in diff["added_links"]:
+        added.setdefault(source, set()).add(target)
+    for source, target in diff["removed_links"]:
+        removed.setdefault(source, set()).add(target)
+    links_before = {
+        page: (corpus.get(page, set()) - added.get(page, set()))
+        | removed.get(page, set())
+        for page in added.keys() | removed.keys()
+    }
+
+    # The teleport and dangling terms are shared by every page, so their
+    # change is tracked as a single uniform residual
+    dangling_before = sum(
+        rank for page, rank in ranks.items()
+        if not links_before.get(page, corpus.get(page))
+    )
+    dangling_after = sum(ranks.get(graph.pages[i], 0) for i in graph.dangling)
+    shared_before = (
+        (1 - damping_factor) + damping_factor * dangling_before
+    ) / len(ranks)
+    shared_after = (
+        (1 - damping_factor) + damping_factor * dangling_after
+    ) / N
+
+    # New pages have no rank yet, but already receive the old shared term
+    residuals = dict()
+    for page in diff["added_pages"]:
+        residuals[index[page]] = shared_before
+
+    # Move the contribution of every changed page from its old links to
+    # its new ones
+    for page, before in links_before.items():
+        after = corpus.get(page, set())
+        rank = ranks.get(page, 0)
+        for links, sign in ((before, -1), (after, 1)):
+            if not links:
+                continue
+            share = sign * damping_factor * rank / len(links)
+            for link in links:
+                if link in index:
+                    i = index[link]
+                    residuals[i] = residuals.get(i, 0) + share
+
+    values, _ = push_residuals(
+        graph, damping_factor,
+        [ranks.get(page, 0) for page in graph.pages],
+        residuals, shared_after - shared_before, tolerance
+    )
+    return graph.ranks(values)
+
+
+def push_residuals(graph, damping_factor, ranks, residuals, shared,
+                   tolerance=TOLERANCE):
+    """
+    Refine the rank vector `ranks` by pushing residuals along links.
+
+    `residuals` maps page ids to their residual, and `shared` is a residual
+    added to every page on top of that. Pushing a page moves its residual
+    into its rank and passes `damping_factor` of it on to the pages it
+    links to, or to `shared` for dangling pages. The uniform residual is
+    only spread over every page once it outweighs `tolerance`.
+
+    Return a tuple (ranks, pushes).
+    """
+    N = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    threshold = tolerance / N
+    ranks = list(ranks)
+
+    queue = deque(i for i, r in residuals.items() if abs(r) > threshold)
+    queued = set(queue)
+    pushes = 0
+    while True:
+        while queue:
+            i = queue.popleft()
+            queued.discard(i)
+            residual = residuals.pop(i, 0)
+            ranks[i] += residual
+            pushes += 1
+
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                shared += damping_factor * residual / N
+                continue
+            share = damping_factor * residual / (end - start)
+            for j in targets[start:end]:
+                r = residuals.get(j, 0) + share
+                residuals[j] = r
+                if abs(r) > threshold and j not in queued:
+                    queue.append(j)
+                    queued.add(j)
+
+        if N * abs(shared) <= tolerance:
+            break
+        for i in range(N):
+            r = residuals.get(i, 0) + shared
+            residuals[i] = r
+            if abs(r) > threshold:
+                queue.append(i)
+                queued.add(i)
+        shared = 0
+
+    # A small uniform residual would end up spread almost evenly, each
+    # page receiving it once per step of the geometric series
+    extra = shared / (1 - damping_factor)
+    ranks = [rank + extra for rank in ranks]
+    total = sum(ranks)
+    return [rank / total for rank in ranks], pushes
+
+
+SOLVERS = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "extrapolation": extrapolated_power_iteration,
+    "adaptive": adaptive_power_iteration
+}
 
 
 if __name__ == "__main__":